@@ -1,11 +1,25 @@
+import asyncio
+import datetime
+import json
+from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 
 from app.auth.utils import user_get
-from app.database import get_session
+from app.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ORDER_BATCH_CHUNK_SIZE, SSE_KEEPALIVE_SECONDS, ARCHIVE_AFTER_DAYS
+from app.database import read_session, write_session
 
-from app.crud.order import create_order, get_orders, get_order
-from app.schemas.order import OrderCreate
+from app.crud.archive import archive_orders_in_chunks, purge_archived_orders_in_chunks, get_archived_orders, \
+    get_archived_order
+from app.crud.idempotency import run_idempotent
+from app.crud.order import create_order, get_orders, get_order, create_orders_batch, update_order_status, \
+    get_order_status, get_order_statuses
+from app.events import order_status_hub, Subscription
+from app.fulfilment import fulfilment_queue
+from app.schemas.order import OrderCreate, OrderBatchResult, OrderStatusUpdate, OrderStatusQuery, OrderStatusSummary, \
+    OrderStatusBatch, FulfilmentRequest, FulfilmentQueued
+from app.streaming import iter_lines
 
 router = APIRouter()
 
@@ -14,35 +28,206 @@ router = APIRouter()
 async def create_order_endpoint(
         order: OrderCreate,
         current_user: user_get,
-        db: get_session,
+        db: write_session,
+        idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None,
 ):
-    return await create_order(db, order, current_user.id)
+    return await run_idempotent(
+        db, idempotency_key, f"POST /orders/ user:{current_user.id}", order,
+        lambda: create_order(db, order, current_user.id),
+    )
+
+
+async def iter_batch_orders(request: Request):
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        index = 0
+        async for line in iter_lines(request.stream()):
+            if line.strip():
+                yield index, line
+                index += 1
+        return
+
+    try:
+        orders = await request.json()
+    except ValueError:
+        orders = None
+    if not isinstance(orders, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Expected a JSON array or an application/x-ndjson body of orders")
+    for index, order in enumerate(orders):
+        yield index, order
+
+
+@router.post("/batch", response_model=list[OrderBatchResult])
+async def create_orders_batch_endpoint(
+        request: Request,
+        current_user: user_get,
+):
+    return await create_orders_batch(iter_batch_orders(request), current_user.id, ORDER_BATCH_CHUNK_SIZE)
+
+
+async def order_status_events(request: Request, subscription: Subscription, snapshot: list[OrderStatusSummary]):
+    try:
+        for summary in snapshot:
+            yield f"event: status\ndata: {json.dumps({'order_id': summary.order_id, 'status': summary.status})}\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: status\ndata: {json.dumps(event)}\n\n"
+    finally:
+        order_status_hub.unsubscribe(subscription)
+
+
+@router.get("/status/stream")
+async def stream_order_status_endpoint(
+        request: Request,
+        current_user: user_get,
+        db: read_session,
+        order_id: Annotated[Optional[list[int]], Query()] = None,
+):
+    user_id = None if current_user.is_superuser else current_user.id
+    # subscribe before reading the snapshot so that no change falls in between
+    subscription = order_status_hub.subscribe(order_ids=set(order_id) if order_id else None, user_id=user_id)
+    snapshot = await get_order_statuses(db, order_id, user_id) if order_id else []
+    return StreamingResponse(order_status_events(request, subscription, snapshot), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/status", response_model=OrderStatusBatch)
+async def get_order_statuses_endpoint(
+        query: OrderStatusQuery,
+        current_user: user_get,
+        db: read_session,
+):
+    statuses = await get_order_statuses(db, query.order_ids, current_user.id if not current_user.is_superuser else None)
+    found = {summary.order_id for summary in statuses}
+    return OrderStatusBatch(orders=statuses, missing=sorted(set(query.order_ids) - found))
+
+
+@router.post("/fulfilment", response_model=FulfilmentQueued, status_code=status.HTTP_202_ACCEPTED)
+async def request_fulfilment_endpoint(
+        fulfilment: FulfilmentRequest,
+        current_user: user_get,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to fulfil orders")
+    if not fulfilment_queue:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Fulfilment workers are disabled")
+    return FulfilmentQueued(queued=await fulfilment_queue.request(fulfilment.order_ids, fulfilment.status))
+
+
+@router.get("/fulfilment/stats")
+async def get_fulfilment_stats_endpoint(
+        current_user: user_get,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to view fulfilment stats")
+    return fulfilment_queue.stats() if fulfilment_queue else {"workers": 0}
+
+
+@router.post("/archive")
+async def archive_orders_endpoint(
+        current_user: user_get,
+        older_than_days: Annotated[int, Query(ge=0)] = ARCHIVE_AFTER_DAYS,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to archive orders")
+    return await archive_orders_in_chunks(older_than_days)
+
+
+@router.delete("/archive")
+async def purge_archived_orders_endpoint(
+        current_user: user_get,
+        created_before: datetime.datetime,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to purge archived orders")
+    return await purge_archived_orders_in_chunks(created_before)
+
+
+@router.get("/archive")
+async def get_archived_orders_endpoint(
+        current_user: user_get,
+        db: read_session,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None,
+        sort: Literal["asc", "desc"] = "asc",
+):
+    return await get_archived_orders(
+        db, limit, cursor,
+        user_id=current_user.id if not current_user.is_superuser else None,
+        created_from=created_from,
+        created_to=created_to,
+        descending=sort == "desc",
+    )
+
+
+@router.get("/archive/{order_id}")
+async def get_archived_order_endpoint(
+        order_id: int,
+        current_user: user_get,
+        db: read_session,
+):
+    return await get_archived_order(db, order_id, current_user.id if not current_user.is_superuser else None)
 
 
 @router.get("/")
 async def get_orders_endpoint(
         current_user: user_get,
-        db: get_session,
+        db: read_session,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None,
+        product_id: Optional[int] = None,
+        sort: Literal["asc", "desc"] = "asc",
 ):
-    return await get_orders(db, current_user.id if not current_user.is_superuser else None)
+    return await get_orders(
+        db, limit, cursor,
+        user_id=current_user.id if not current_user.is_superuser else None,
+        status=status,
+        created_from=created_from,
+        created_to=created_to,
+        product_id=product_id,
+        descending=sort == "desc",
+    )
 
 
 @router.get("/{order_id}")
 async def get_order_endpoint(
         order_id: int,
         current_user: user_get,
-        db: get_session,
+        db: read_session,
 ):
     return await get_order(db, order_id)
 
 
-@router.get('/{order_id}/status')
+@router.get('/{order_id}/status', response_model=OrderStatusSummary)
 async def get_order_status_endpoint(
         order_id: int,
         current_user: user_get,
-        db: get_session,
+        db: read_session,
 ):
-    order = await get_order(db, order_id)
-    return {"status": order.order_details[0].status}
+    return await get_order_status(db, order_id, current_user.id if not current_user.is_superuser else None)
 
 
+@router.put('/{order_id}/status', response_model=OrderStatusSummary)
+async def update_order_status_endpoint(
+        order_id: int,
+        order_status: OrderStatusUpdate,
+        current_user: user_get,
+        db: write_session,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to update order status")
+    return await update_order_status(db, order_id, order_status.status)
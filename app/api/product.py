@@ -1,43 +1,151 @@
+from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from app.auth.utils import user_get
-from app.database import get_session
+from app.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, IMPORT_BATCH_SIZE, \
+    MAX_IMPORT_BATCH_SIZE
+from app.database import read_session, write_session
 
-from app.crud.product import create_product, get_products, get_product, update_product, delete_product
-from app.schemas.product import ProductResponse, ProductCreate, ProductUpdate
+from app.crud.idempotency import run_idempotent
+from app.crud.product import create_product, get_products_cached, get_product_cached, update_product, delete_product, \
+    search_products, import_products, export_products, get_product_changes, get_product_stock, product_cache
+from app.schemas.pagination import Page
+from app.schemas.product import ProductResponse, ProductCreate, ProductUpdate, ProductChanges, CatalogProduct, \
+    ProductStock
+from app.streaming import iter_lines, gzip_chunks, encode_chunks
 
 
 router = APIRouter()
 
 
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
 @router.post("/", response_model=ProductResponse)
 async def create_product_endpoint(
         product: ProductCreate,
         current_user: user_get,
-        db: get_session,
+        db: write_session,
+        idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None,
 ):
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to create product")
-    return await create_product(db, product)
+    return await run_idempotent(
+        db, idempotency_key, f"POST /products/ user:{current_user.id}", product,
+        lambda: create_product(db, product), ProductResponse,
+    )
+
+
+@router.post("/import")
+async def import_products_endpoint(
+        request: Request,
+        current_user: user_get,
+        fmt: Annotated[Literal["csv", "ndjson"], Query(alias="format")] = "ndjson",
+        batch_size: Annotated[int, Query(ge=1, le=MAX_IMPORT_BATCH_SIZE)] = IMPORT_BATCH_SIZE,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to import products")
+    return await import_products(iter_lines(request.stream()), fmt, batch_size)
+
+
+@router.get("/changes", response_model=ProductChanges)
+async def get_product_changes_endpoint(
+        current_user: user_get,
+        db: read_session,
+        since: Optional[str] = None,
+):
+    return await get_product_changes(db, since)
+
+
+@router.get("/export")
+async def export_products_endpoint(
+        current_user: user_get,
+        fmt: Annotated[Literal["csv", "ndjson"], Query(alias="format")] = "ndjson",
+        gzip: bool = False,
+):
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="products.{fmt}{".gz" if gzip else ""}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_chunks(export_products(fmt))
+    else:
+        body = encode_chunks(export_products(fmt))
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 
-@router.get("/", response_model=list[ProductResponse])
+@router.get("/", response_model=Page[CatalogProduct])
 async def get_products_endpoint(
+        request: Request,
+        response: Response,
+        current_user: user_get,
+        db: read_session,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+):
+    etag = product_cache.etag
+    if not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return await get_products_cached(db, limit, cursor)
+
+
+@router.get("/search", response_model=list[CatalogProduct])
+async def search_products_endpoint(
+        request: Request,
+        response: Response,
         current_user: user_get,
-        db: get_session,
+        db: read_session,
+        q: Annotated[str, Query(min_length=1, max_length=100)],
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_SEARCH_LIMIT,
 ):
-    return await get_products(db)
+    etag = product_cache.etag
+    if not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return await search_products(db, q, limit)
+
+
+@router.get("/stock", response_model=list[ProductStock])
+async def get_product_stock_endpoint(
+        current_user: user_get,
+        db: read_session,
+        product_id: Annotated[list[int], Query(min_length=1, max_length=MAX_PAGE_SIZE)],
+):
+    # not cached and without an ETag: stock changes with every checkout
+    return await get_product_stock(db, product_id)
+
+
+@router.get("/cache/stats")
+async def get_product_cache_stats_endpoint(
+        current_user: user_get,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to view cache stats")
+    return product_cache.stats()
 
 
-@router.get("/{product_id}", response_model=ProductResponse)
+@router.get("/{product_id}", response_model=CatalogProduct)
 async def get_product_endpoint(
         product_id: int,
+        request: Request,
+        response: Response,
         current_user: user_get,
-        db: get_session,
+        db: read_session,
 ):
-    return await get_product(db, product_id)
+    etag = product_cache.etag
+    if not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return await get_product_cached(db, product_id)
 
 
 @router.put("/{product_id}", response_model=ProductResponse)
@@ -45,7 +153,7 @@ async def update_product_endpoint(
         product_id: int,
         product: ProductUpdate,
         current_user: user_get,
-        db: get_session,
+        db: write_session,
 ):
     if not current_user.is_superuser:
         raise HTTPException(
@@ -57,7 +165,7 @@ async def update_product_endpoint(
 async def delete_product_endpoint(
         product_id: int,
         current_user: user_get,
-        db: get_session
+        db: write_session
 ):
     if not current_user.is_superuser:
         raise HTTPException(
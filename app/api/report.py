@@ -0,0 +1,39 @@
+import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from app.auth.utils import user_get
+from app.database import read_session, write_session
+
+from app.crud.report import get_sales_report, rebuild_sales_rollups
+from app.schemas.report import SalesReport
+
+router = APIRouter()
+
+
+@router.get("/sales", response_model=SalesReport)
+async def get_sales_report_endpoint(
+        current_user: user_get,
+        db: read_session,
+        date_from: Optional[datetime.date] = None,
+        date_to: Optional[datetime.date] = None,
+        top: Annotated[int, Query(ge=1, le=100)] = 10,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to view reports")
+    date_to = date_to or datetime.datetime.now(datetime.timezone.utc).date()
+    date_from = date_from or date_to - datetime.timedelta(days=30)
+    return await get_sales_report(db, date_from, date_to, top)
+
+
+@router.post("/sales/rebuild")
+async def rebuild_sales_rollups_endpoint(
+        current_user: user_get,
+        db: write_session,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="You do not have permission to rebuild reports")
+    return await rebuild_sales_rollups(db)
@@ -1,14 +1,18 @@
 from datetime import timedelta
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
+from app.auth.hashing import password_hash_pool
+from app.auth.revocation import revocation_store
 from app.auth.schema import Token, UserRead, UserCreate, UserUpdate
 from app.auth.utils import authenticate_user, create_access_token, get_current_active_user, create_user, \
-    blacklist_token, get_users, get_user_by_id, update_user, delete_user, read_me, user_get
-from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
-from app.database import get_session
+    blacklist_token, get_users, get_user_by_id, update_user, delete_user, read_me, user_get, principal_cache, \
+    get_password_hash
+from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.crud.idempotency import run_idempotent
+from app.database import read_session, write_session, writer_session
 
 from app.auth.utils import oauth2_scheme
 
@@ -20,7 +24,7 @@ router = APIRouter()
 async def login(
         request: Request,
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-        db: get_session,
+        db: read_session,
 ) -> Token:
     user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
@@ -41,34 +45,60 @@ async def logout(
         current_user: user_get,
         token: Annotated[str, Depends(oauth2_scheme)],
 ):
-    blacklist_token(token)
+    await blacklist_token(token)
     return {"msg": "Успешно вышли из системы"}
 
 
+@router.get("/hash-pool/stats")
+async def get_hash_pool_stats_endpoint(
+        current_user: user_get,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="У вас нет прав на просмотр статистики")
+    return password_hash_pool.stats()
+
+
+@router.get("/principal-cache/stats")
+async def get_principal_cache_stats_endpoint(
+        current_user: user_get,
+):
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="У вас нет прав на просмотр статистики")
+    return {**principal_cache.stats(), "revocations": revocation_store.stats()}
+
+
 router_user = APIRouter()
 
 
 @router_user.post("/")
 async def register_user(
         user: UserCreate,
-        db: get_session,
+        idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None,
 ):
-    return await create_user(db, user)
+    # hash before taking the writer, or every registration would stall all writes for the whole bcrypt run
+    hashed_password = await get_password_hash(user.hashed_password)
+    async with writer_session() as db:
+        return await run_idempotent(db, idempotency_key, "POST /user/", user,
+                                    lambda: create_user(db, user, hashed_password))
 
 
 @router_user.get("/")
 async def get_users_endpoint(
         current_user: user_get,
-        db: get_session,
+        db: read_session,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
 ):
-    return await get_users(db)
+    return await get_users(db, limit, cursor)
 
 
 @router_user.get('/{user_id}')
 async def get_user_by_id_endpoint(
         user_id: int,
         current_user: user_get,
-        db: get_session,
+        db: read_session,
 ):
     if not current_user.is_superuser:
         raise HTTPException(
@@ -80,16 +110,17 @@ async def get_user_by_id_endpoint(
 async def update_user_endpoint(
         user: UserUpdate,
         current_user: user_get,
-        db: get_session,
 ):
-    return await update_user(db, current_user.id, user)
+    hashed_password = await get_password_hash(user.hashed_password) if user.hashed_password else None
+    async with writer_session() as db:
+        return await update_user(db, current_user.id, user, hashed_password)
 
 
 @router_user.delete('/{user_id}')
 async def delete_user_endpoint(
         user_id: int,
         current_user: user_get,
-        db: get_session,
+        db: write_session,
 ):
     if not current_user.is_superuser:
         raise HTTPException(
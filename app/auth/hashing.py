@@ -0,0 +1,74 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE
+
+
+class PasswordHashPool:
+    """Runs bcrypt in a small thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL while it works, so threads give real parallelism.
+    At most ``workers + queue_size`` calls may be waiting or running; beyond
+    that callers get a 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.calls = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, func, *args):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Password hashing is overloaded, try again later",
+                                headers={"Retry-After": "1"})
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.record(started - submitted, time.perf_counter() - started)
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+        finally:
+            self.pending -= 1
+
+    def record(self, waited: float, ran: float):
+        # called from the worker threads; the counters are only informational
+        self.calls += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.run_seconds += ran
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.wait_seconds / self.calls if self.calls else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "avg_run_seconds": self.run_seconds / self.calls if self.calls else 0.0,
+        }
+
+
+password_hash_pool = PasswordHashPool()
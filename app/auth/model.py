@@ -17,8 +17,21 @@ class User(Base):
     disabled: Mapped[bool] = mapped_column(Boolean, default=False)
     is_superuser: Mapped[bool] = mapped_column(Boolean, default=False)
 
-    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True,
                                                           default=lambda: datetime.datetime.now(datetime.timezone.utc))
     updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
                                                           default=lambda: datetime.datetime.now(datetime.timezone.utc),
                                                           onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+class RevokedToken(Base):
+    __tablename__ = 'revoked_token'
+    # AUTOINCREMENT: ids of pruned rows must never be reused, or workers past them would miss new revocations
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    # increasing id lets every worker pull only the revocations it has not seen yet
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    jti: Mapped[str] = mapped_column(String(length=64), unique=True)
+    expires_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True)
+    revoked_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
+                                                          default=lambda: datetime.datetime.now(datetime.timezone.utc))
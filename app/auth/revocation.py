@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+import logging
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.future import select
+
+from app.auth.model import RevokedToken
+from app.config import TOKEN_REVOCATION_BACKEND, TOKEN_REVOCATION_SYNC_SECONDS
+from app.database import writer_session
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class MemoryRevocationStore:
+    """Revoked token ids with their expiry, held in this process only.
+
+    An entry is only needed until the token would have expired anyway, so
+    ``sync()`` drops expired entries and the store stays as small as the set
+    of revoked-but-still-valid tokens.
+    """
+
+    def __init__(self, sync_seconds: float = TOKEN_REVOCATION_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._revoked: dict[str, datetime.datetime] = {}
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    async def revoke(self, jti: str, expires_at: datetime.datetime):
+        self._revoked[jti] = expires_at
+
+    async def sync(self):
+        now = utcnow()
+        for jti in [jti for jti, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[jti]
+
+    async def sync_forever(self):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Syncing revoked tokens failed")
+
+    def stats(self) -> dict:
+        return {"backend": TOKEN_REVOCATION_BACKEND, "revoked": len(self._revoked)}
+
+
+class SQLiteRevocationStore(MemoryRevocationStore):
+    """Revocations persisted in ``revoked_token`` and shared by every worker.
+
+    Lookups only hit the local dict; each ``sync()`` pulls the rows added
+    since the last one, so a logout on one worker takes effect on the others
+    within ``sync_seconds``.
+    """
+
+    def __init__(self, sync_seconds: float = TOKEN_REVOCATION_SYNC_SECONDS):
+        super().__init__(sync_seconds)
+        self._last_id = 0
+
+    async def revoke(self, jti: str, expires_at: datetime.datetime):
+        await super().revoke(jti, expires_at)
+        async with writer_session() as session:
+            await session.execute(
+                insert(RevokedToken).values(jti=jti, expires_at=expires_at, revoked_at=utcnow())
+                .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+            )
+            await session.commit()
+
+    async def sync(self):
+        async with writer_session() as session:
+            # the newest row is kept even when expired so the id sequence never falls behind a worker's watermark
+            await session.execute(delete(RevokedToken).where(
+                RevokedToken.expires_at <= utcnow(),
+                RevokedToken.id < select(func.max(RevokedToken.id)).scalar_subquery(),
+            ))
+            await session.commit()
+            result = await session.execute(
+                select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+                .where(RevokedToken.id > self._last_id)
+                .order_by(RevokedToken.id)
+            )
+            for row_id, jti, expires_at in result.all():
+                self._revoked[jti] = expires_at.replace(tzinfo=expires_at.tzinfo or datetime.timezone.utc)
+                self._last_id = row_id
+        await super().sync()
+
+
+REVOCATION_BACKENDS = {
+    "memory": MemoryRevocationStore,
+    "sqlite": SQLiteRevocationStore,
+}
+
+revocation_store = REVOCATION_BACKENDS[TOKEN_REVOCATION_BACKEND]()
@@ -1,12 +1,12 @@
 from app.auth.model import User
 from app.auth.utils import get_password_hash
-from app.database import async_session_maker
+from app.database import writer_session
 from sqlalchemy.future import select
 
 
 async def create_superuser():
 
-    async with async_session_maker() as session:
+    async with writer_session() as session:
         async with session.begin():
             result = await session.execute(select(User).filter_by(username='admin'))
             superuser = result.scalars().first()
@@ -15,7 +15,7 @@ async def create_superuser():
                 superuser = User(
                     username="admin",
                     full_name="Super User",
-                    hashed_password=get_password_hash("admin"),
+                    hashed_password=await get_password_hash("admin"),
                     is_superuser=True,
                     disabled=False
                 )
@@ -1,5 +1,8 @@
-from datetime import timedelta, datetime
-from typing import Annotated, Set
+import hashlib
+import time
+import uuid
+from datetime import timedelta, datetime, timezone
+from typing import Annotated, Optional
 import pytz
 
 from sqlalchemy.future import select
@@ -12,31 +15,48 @@ from jwt import InvalidTokenError
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.hashing import password_hash_pool
 from app.auth.model import User
+from app.auth.revocation import revocation_store
 from app.auth.schema import TokenData, UserRead, UserCreate, UserResponse, UserUpdate
-from app.config import SECRET, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from app.database import get_async_session
+from app.cache import LRUCache
+from app.config import SECRET, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS
+from app.crud.pagination import paginate
+from app.database import get_read_session
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-token_blacklist: Set[str] = set()
+# verified token -> (its user detached from the session that loaded it, token id)
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
 
-def blacklist_token(token: str):
-    token_blacklist.add(token)
 
+def token_id(token: str, payload: dict) -> str:
+    # tokens issued before jti was added are revoked by their hash
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
 
-def is_token_blacklisted(token: str) -> bool:
-    return token in token_blacklist
+
+async def blacklist_token(token: str):
+    payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
+    await revocation_store.revoke(token_id(token, payload), datetime.fromtimestamp(payload["exp"], timezone.utc))
+    principal_cache.delete(token)
+
+
+def invalidate_principals(user_id: int):
+    principal_cache.discard(lambda token, principal: principal[0].id == user_id)
+
+
+def is_token_blacklisted(jti: str) -> bool:
+    return revocation_store.is_revoked(jti)
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hash_pool.run(pwd_context.verify, plain_password, hashed_password)
 
 
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
+async def get_password_hash(password: str):
+    return await password_hash_pool.run(pwd_context.hash, password)
 
 
 async def get_user(db: AsyncSession, username: str):
@@ -49,7 +69,9 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # hand the connection back to the pool before hashing, or a burst of logins drains it for every reader
+    await db.close()
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -61,22 +83,28 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.now(current_tz) + expires_delta
     else:
         expire = datetime.now(current_tz) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 async def get_current_user(
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: Annotated[AsyncSession, Depends(get_async_session)],
+        db: Annotated[AsyncSession, Depends(get_read_session)],
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    if is_token_blacklisted(token):
-        raise credentials_exception
+    principal = principal_cache.get(token)
+    if principal is not None:
+        user, jti = principal
+        if is_token_blacklisted(jti):
+            raise credentials_exception
+        return user
+
+    version = principal_cache.version
     try:
         payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -85,9 +113,17 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
+    jti = token_id(token, payload)
+    if is_token_blacklisted(jti):
+        raise credentials_exception
     user = await get_user(db, username=token_data.username)
     if user is None:
         raise credentials_exception
+    # detach so that a later rollback of this request's session cannot expire the cached copy
+    db.expunge(user)
+    # return the read connection now; write endpoints would otherwise hold it while they queue for the writer
+    await db.close()
+    principal_cache.set(token, (user, jti), version, ttl=payload["exp"] - time.time())
     return user
 
 
@@ -99,12 +135,10 @@ async def get_current_active_user(
     return current_user
 
 
-async def create_user(db: AsyncSession, user: UserCreate):
-
+async def create_user(db: AsyncSession, user: UserCreate, hashed_password: str):
+    """``hashed_password`` is hashed by the caller before it takes the writer, see ``get_password_hash``."""
     try:
         print(user)
-        hashed_password = get_password_hash(user.hashed_password)
-
         user = User(
             hashed_password=hashed_password,
             username=user.username,
@@ -125,10 +159,8 @@ async def create_user(db: AsyncSession, user: UserCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def get_users(db: AsyncSession):
-    res = await db.execute(select(User))
-    users = res.scalars().all()
-    return users or []
+async def get_users(db: AsyncSession, limit: int, cursor: Optional[str] = None):
+    return await paginate(db, select(User), User, limit, cursor)
 
 
 async def get_user_by_id(db: AsyncSession, user_id: int):
@@ -141,7 +173,8 @@ async def get_user_by_id(db: AsyncSession, user_id: int):
     return user
 
 
-async def update_user(db: AsyncSession, user_id: int, user: UserUpdate):
+async def update_user(db: AsyncSession, user_id: int, user: UserUpdate, hashed_password: Optional[str] = None):
+    """``hashed_password`` replaces the plain password in ``user`` and is hashed by the caller beforehand."""
     res_username = await db.execute(select(User).filter_by(username=user.username))
     user_username = res_username.scalars().first()
     if user_username:
@@ -152,13 +185,13 @@ async def update_user(db: AsyncSession, user_id: int, user: UserUpdate):
 
     try:
         if user.hashed_password:
-            hashed_pass = get_password_hash(user.hashed_password)
-            user.hashed_password = hashed_pass
+            user.hashed_password = hashed_password
 
         for key, value in user.model_dump(exclude_unset=True).items():
             setattr(user_db, key, value)
 
         await db.commit()
+        invalidate_principals(user_id)
         return user_db
     except Exception as e:
         await db.rollback()
@@ -170,6 +203,7 @@ async def delete_user(db: AsyncSession, user_id: int):
     try:
         await db.delete(user)
         await db.commit()
+        invalidate_principals(user_id)
         return {"detail": "Пользователь успешно удален"}
     except Exception as e:
         await db.rollback()
@@ -181,6 +215,7 @@ async def read_me(current_user, token: Annotated[str, Depends(oauth2_scheme)]):
     current_tz = pytz.timezone('Asia/Tashkent')
     new_expire = datetime.now(current_tz) + timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
     payload['exp'] = new_expire
+    payload['jti'] = uuid.uuid4().hex
     new_token = jwt.encode(payload, SECRET, algorithm=ALGORITHM)
 
     return {"user": current_user, "token": new_token}
@@ -0,0 +1,87 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Bounded in-process LRU cache with optional per-entry expiry.
+
+    ``version`` is bumped on every ``invalidate()``; together with a per-process
+    token it forms a strong ETag for everything served out of the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._data: OrderedDict[Hashable, tuple[Any, Optional[float]]] = OrderedDict()
+        self._token = uuid.uuid4().hex[:12]
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._token}-{self.version}"'
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.expired += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like ``get`` but leaves the LRU order and the hit counters alone."""
+        value, expires_at = self._data.get(key, (default, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None, ttl: Optional[float] = None):
+        # a value read before an invalidation must not be stored after it
+        if version is not None and version != self.version:
+            return
+        # a per-entry ttl can only shorten the cache-wide one
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl or ttl)
+        self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self):
+        self._data.clear()
+        self.version += 1
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+        self.version += 1
+
+    def discard(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which ``predicate(key, value)`` is true."""
+        keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+        for key in keys:
+            del self._data[key]
+        self.version += 1
+        return len(keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
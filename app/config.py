@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -6,3 +7,82 @@ load_dotenv()
 SECRET = os.getenv("SECRET")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+# "tuned" applies the pragmas below on every SQLite connection, "default" leaves SQLite's own settings
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+# level of the app's own loggers (app.*); uvicorn only configures its own
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# share of requests whose SQL is counted and timed; 0 turns the tracing off
+SQL_TRACE_SAMPLE_RATE = float(os.getenv("SQL_TRACE_SAMPLE_RATE", 0.1))
+# warn when one statement shape runs more than this many times in a request
+SQL_TRACE_REPEAT_THRESHOLD = int(os.getenv("SQL_TRACE_REPEAT_THRESHOLD", 10))
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 64))
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 4096))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+
+# "sqlite" shares revocations between workers through the database, "memory" keeps them per process
+TOKEN_REVOCATION_BACKEND = os.getenv("TOKEN_REVOCATION_BACKEND", "sqlite")
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", 5))
+
+# "METHOD /exact/path" -> token bucket refilled at ``rate`` requests/second holding up to ``burst``,
+# keyed by the caller's user or by client IP; "*" applies to every other route
+RATE_LIMITS = json.loads(os.getenv("RATE_LIMITS", json.dumps({
+    "POST /auth/login": {"rate": 0.5, "burst": 5, "key": "ip"},
+    "POST /orders/": {"rate": 5, "burst": 20, "key": "user"},
+    "POST /orders/batch": {"rate": 1, "burst": 5, "key": "user"},
+    "*": {"rate": 50, "burst": 200, "key": "user"},
+})))
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100_000))
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 500))
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 1024))
+DEFAULT_SEARCH_LIMIT = int(os.getenv("DEFAULT_SEARCH_LIMIT", 20))
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+MAX_IMPORT_BATCH_SIZE = int(os.getenv("MAX_IMPORT_BATCH_SIZE", 10000))
+MAX_IMPORT_ERRORS = int(os.getenv("MAX_IMPORT_ERRORS", 1000))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+IDEMPOTENCY_PRUNE_INTERVAL_SECONDS = int(os.getenv("IDEMPOTENCY_PRUNE_INTERVAL_SECONDS", 10 * 60))
+# a key still without a response after this long belongs to a request that died mid-way
+IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS", 60))
+
+ORDER_BATCH_CHUNK_SIZE = int(os.getenv("ORDER_BATCH_CHUNK_SIZE", 200))
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 100))
+SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+MAX_STATUS_BATCH_SIZE = int(os.getenv("MAX_STATUS_BATCH_SIZE", 500))
+
+FULFILMENT_WORKERS = int(os.getenv("FULFILMENT_WORKERS", 2))
+FULFILMENT_BATCH_SIZE = int(os.getenv("FULFILMENT_BATCH_SIZE", 100))
+FULFILMENT_QUEUE_SIZE = int(os.getenv("FULFILMENT_QUEUE_SIZE", 1000))
+FULFILMENT_MAX_RETRIES = int(os.getenv("FULFILMENT_MAX_RETRIES", 5))
+FULFILMENT_RETRY_BACKOFF_SECONDS = float(os.getenv("FULFILMENT_RETRY_BACKOFF_SECONDS", 0.5))
+
+STOCK_RESERVATION_TIMEOUT_SECONDS = int(os.getenv("STOCK_RESERVATION_TIMEOUT_SECONDS", 30 * 60))
+STOCK_SWEEP_INTERVAL_SECONDS = int(os.getenv("STOCK_SWEEP_INTERVAL_SECONDS", 60))
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", 500))
+# 0 disables the background archival job; it can still be run via the API or ``python -m app.manage archive-orders``
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 60 * 60))
+
+# with several uvicorn workers, point this at a directory shared by them so /metrics reports all of them
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_SNAPSHOT_SECONDS = float(os.getenv("METRICS_SNAPSHOT_SECONDS", 5))
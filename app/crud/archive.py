@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert, delete, literal, TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_SIZE, ARCHIVE_INTERVAL_SECONDS
+from app.crud.pagination import paginate
+from app.database import writer_session
+from app.models.order import Order, OrderDetail, OrderArchive, OrderDetailArchive
+from app.timestamps import to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+# lines in these statuses never change again, so their orders are safe to move
+FINISHED_STATUSES = ("completed", "cancelled")
+
+
+async def archive_orders(db: AsyncSession, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                         chunk_size: int = ARCHIVE_CHUNK_SIZE, max_chunks: Optional[int] = None):
+    """Move finished orders created more than ``older_than_days`` ago into the archive tables.
+
+    Each chunk is one transaction of ``INSERT ... SELECT`` into the archive
+    tables followed by ``DELETE`` from the live ones, so nothing is loaded
+    into Python and the write lock is held for at most ``chunk_size`` orders.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(days=older_than_days)
+    archived_at = literal(now, TIMESTAMP(timezone=True))
+    order_columns = [column.name for column in Order.__table__.columns]
+    detail_columns = [column.name for column in OrderDetail.__table__.columns]
+
+    archived = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        order_ids = await db.execute(
+            select(Order.id)
+            .where(Order.created_at < cutoff, ~Order.order_details.any(OrderDetail.status.notin_(FINISHED_STATUSES)))
+            .order_by(Order.id)
+            .limit(chunk_size)
+        )
+        order_ids = order_ids.scalars().all()
+        if not order_ids:
+            break
+
+        await db.execute(insert(OrderArchive).from_select(
+            order_columns + ["archived_at"],
+            select(*Order.__table__.c, archived_at).where(Order.id.in_(order_ids)),
+        ))
+        await db.execute(insert(OrderDetailArchive).from_select(
+            detail_columns,
+            select(*OrderDetail.__table__.c).where(OrderDetail.order_id.in_(order_ids)),
+        ))
+        await db.execute(delete(OrderDetail).where(OrderDetail.order_id.in_(order_ids))
+                         .execution_options(synchronize_session=False))
+        await db.execute(delete(Order).where(Order.id.in_(order_ids))
+                         .execution_options(synchronize_session=False))
+        await db.commit()
+        archived += len(order_ids)
+        chunks += 1
+
+    return {"archived": archived}
+
+
+async def archive_orders_in_chunks(older_than_days: int = ARCHIVE_AFTER_DAYS, chunk_size: int = ARCHIVE_CHUNK_SIZE):
+    """``archive_orders`` with one chunk per writer session, so that request writes can interleave."""
+    archived = 0
+    while True:
+        async with writer_session() as session:
+            result = await archive_orders(session, older_than_days, chunk_size, max_chunks=1)
+        if not result["archived"]:
+            return {"archived": archived}
+        archived += result["archived"]
+
+
+async def archive_orders_forever():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        try:
+            result = await archive_orders_in_chunks()
+            if result["archived"]:
+                logger.info("Archived %d orders", result["archived"])
+        except Exception:
+            logger.exception("Archiving orders failed")
+
+
+async def purge_archived_orders(db: AsyncSession, created_before: datetime.datetime,
+                                chunk_size: int = ARCHIVE_CHUNK_SIZE, max_chunks: Optional[int] = None):
+    """Permanently delete archived orders created before ``created_before``, ``chunk_size`` orders per transaction."""
+    purged = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        order_ids = await db.execute(
+            select(OrderArchive.id)
+            .where(OrderArchive.created_at < to_naive_utc(created_before))
+            .order_by(OrderArchive.id)
+            .limit(chunk_size)
+        )
+        order_ids = order_ids.scalars().all()
+        if not order_ids:
+            break
+
+        await db.execute(delete(OrderDetailArchive).where(OrderDetailArchive.order_id.in_(order_ids))
+                         .execution_options(synchronize_session=False))
+        await db.execute(delete(OrderArchive).where(OrderArchive.id.in_(order_ids))
+                         .execution_options(synchronize_session=False))
+        await db.commit()
+        purged += len(order_ids)
+        chunks += 1
+
+    return {"purged": purged}
+
+
+async def purge_archived_orders_in_chunks(created_before: datetime.datetime, chunk_size: int = ARCHIVE_CHUNK_SIZE):
+    """``purge_archived_orders`` with one chunk per writer session."""
+    purged = 0
+    while True:
+        async with writer_session() as session:
+            result = await purge_archived_orders(session, created_before, chunk_size, max_chunks=1)
+        if not result["purged"]:
+            return {"purged": purged}
+        purged += result["purged"]
+
+
+async def get_archived_orders(
+        db: AsyncSession,
+        limit: int,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None,
+        descending: bool = False,
+):
+    stmt = select(OrderArchive).filter_by(created_by=user_id) if user_id else select(OrderArchive)
+    if created_from:
+        stmt = stmt.where(OrderArchive.created_at >= to_naive_utc(created_from))
+    if created_to:
+        stmt = stmt.where(OrderArchive.created_at < to_naive_utc(created_to))
+    return await paginate(db, stmt, OrderArchive, limit, cursor, descending)
+
+
+async def get_archived_order(db: AsyncSession, order_id: int, user_id: Optional[int] = None):
+    stmt = select(OrderArchive).filter_by(id=order_id)
+    if user_id:
+        stmt = stmt.filter_by(created_by=user_id)
+    result = await db.execute(stmt)
+    db_order = result.scalar_one_or_none()
+
+    if not db_order:
+        raise HTTPException(status_code=404, detail="Archived order not found")
+
+    return db_order
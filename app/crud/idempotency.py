@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import weakref
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import and_, delete, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_PRUNE_INTERVAL_SECONDS, \
+    IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS
+from app.database import writer_session
+from app.models.idempotency import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# serializes duplicates inside one process; the primary key does it across processes
+_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+
+def request_hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+async def run_idempotent(
+        db: AsyncSession,
+        key: Optional[str],
+        scope: str,
+        payload: Any,
+        handler: Callable[[], Awaitable[Any]],
+        response_model: Optional[type[BaseModel]] = None,
+):
+    """Run ``handler`` once per ``(key, scope)`` and replay its stored response afterwards.
+
+    Without a key the handler simply runs. Failed requests release the key so
+    that the client can retry them. A key left in progress for longer than
+    ``IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS`` (the process died before storing
+    the response) is treated as abandoned and the request runs again.
+    """
+    if key is None:
+        return await handler()
+
+    digest = request_hash(payload)
+    lock = _locks.get((key, scope))
+    if lock is None:
+        lock = _locks[(key, scope)] = asyncio.Lock()
+
+    async with lock:
+        now = utcnow()
+        abandoned_before = now - datetime.timedelta(seconds=IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS)
+        await db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.scope == scope,
+            or_(
+                IdempotencyKey.expires_at <= now,
+                and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.created_at <= abandoned_before),
+            ),
+        ))
+        record = await db.get(IdempotencyKey, (key, scope))
+
+        if record:
+            if record.request_hash != digest:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    detail="Idempotency-Key was already used with a different request")
+            if record.response_body is None:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="A request with this Idempotency-Key is still in progress")
+            return JSONResponse(record.response_body, status_code=record.status_code,
+                                headers={"Idempotent-Replayed": "true"})
+
+        record = IdempotencyKey(key=key, scope=scope, request_hash=digest,
+                                expires_at=utcnow() + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+        db.add(record)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="A request with this Idempotency-Key is still in progress")
+
+        try:
+            result = await handler()
+        except Exception:
+            await db.rollback()
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.scope == scope))
+            await db.commit()
+            raise
+
+        if response_model is not None:
+            body = response_model.model_validate(result).model_dump(mode="json")
+        else:
+            body = jsonable_encoder(result)
+        record.status_code = status.HTTP_200_OK
+        record.response_body = body
+        await db.commit()
+
+        return result
+
+
+async def prune_idempotency_keys():
+    async with writer_session() as session:
+        await session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= utcnow()))
+        await session.commit()
+
+
+async def prune_idempotency_keys_forever():
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_PRUNE_INTERVAL_SECONDS)
+        try:
+            await prune_idempotency_keys()
+        except Exception:
+            logger.exception("Pruning expired idempotency keys failed")
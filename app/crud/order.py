@@ -1,12 +1,75 @@
-from typing import Optional
+import asyncio
+import datetime
+import logging
+from collections import Counter, defaultdict
+from typing import AsyncIterator, Optional
 
 from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, delete, update, case, func, and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.crud.product import get_product
+from app.crud.pagination import paginate
+from app.events import order_status_hub
+from app.crud.product import get_products_by_ids, load_products
+from app.crud.report import add_to_sales_rollups
+from app.crud.stock import reserve_stock, release_stock
+from app.config import STOCK_RESERVATION_TIMEOUT_SECONDS, STOCK_SWEEP_INTERVAL_SECONDS
+from app.database import writer_session
 from app.models.order import Order, OrderDetail
-from app.schemas.order import OrderCreate, OrderUpdate
+from app.schemas.order import OrderCreate, OrderUpdate, OrderBatchItem, OrderBatchResult, OrderStatusSummary
+from app.timestamps import to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+
+def build_order_lines(order_id: int, quantities: Counter, products: dict, reserved: dict) -> list[dict]:
+    return [
+        {
+            "order_id": order_id,
+            "status": "pending",
+            "product_id": product_id,
+            "quantity": quantity,
+            "reserved_quantity": reserved.get(product_id, 0),
+            "unit_price": products[product_id].price,
+            "line_total": products[product_id].price * quantity,
+            "product_detail": {
+                "product_id": product_id,
+                "product_name": products[product_id].name,
+                "product_price": products[product_id].price,
+                "description": products[product_id].description,
+                "quantity": quantity,
+            },
+        }
+        for product_id, quantity in quantities.items()
+    ]
+
+
+async def add_order_lines(db: AsyncSession, db_order: Order, items: list[int]):
+    quantities = Counter(items)
+    products = await get_products_by_ids(db, quantities)
+    reserved = await reserve_stock(db, quantities, products)
+
+    lines = build_order_lines(db_order.id, quantities, products, reserved)
+    await db.execute(insert(OrderDetail), lines)
+
+    db_order.total_amount = sum(line["line_total"] for line in lines)
+    await add_to_sales_rollups(db, db_order.created_at.date(), lines)
+
+
+async def remove_order_lines(db: AsyncSession, db_order: Order):
+    # cancelled lines, and fully cancelled orders, already left the rollups when they were cancelled
+    lines = [
+        {"product_id": d.product_id, "quantity": d.quantity, "line_total": d.line_total}
+        for d in db_order.order_details if d.status != "cancelled"
+    ]
+    counted = bool(lines) or not db_order.order_details
+    await add_to_sales_rollups(db, db_order.created_at.date(), lines, sign=-1, orders=int(counted))
+    await release_stock(db, OrderDetail.order_id == db_order.id)
+    await db.execute(delete(OrderDetail).where(OrderDetail.order_id == db_order.id)
+                     .execution_options(synchronize_session=False))
 
 
 async def create_order(db: AsyncSession, order: OrderCreate, user_id: int):
@@ -14,17 +77,7 @@ async def create_order(db: AsyncSession, order: OrderCreate, user_id: int):
     db.add(db_order)
     await db.flush()
 
-    for item in order.items:
-        db_product = await get_product(db, item)
-        db_order_detail = OrderDetail(order_id=db_order.id,
-                                      status='pending',
-                                      product_detail={
-                                            "product_id": db_product.id,
-                                            "product_name": db_product.name,
-                                            "product_price": db_product.price,
-                                            "description": db_product.description,
-                                      })
-        db.add(db_order_detail)
+    await add_order_lines(db, db_order, order.items)
 
     await db.commit()
     await db.refresh(db_order)
@@ -32,11 +85,134 @@ async def create_order(db: AsyncSession, order: OrderCreate, user_id: int):
     return db_order
 
 
-async def get_orders(db: AsyncSession, user_id: Optional[int] = None):
+async def create_order_chunk(db: AsyncSession, chunk: list[tuple[int, OrderBatchItem]], user_id: int):
+    """Write one chunk of offline orders in a single transaction.
+
+    Client IDs the user already sent, or that repeat inside the chunk, are reported as duplicates.
+    """
+    results = []
+    client_ids = [item.client_id for _, item in chunk]
+    existing = await db.execute(
+        select(Order.client_id, Order.id).where(Order.created_by == user_id, Order.client_id.in_(client_ids)))
+    order_ids = dict(existing.all())
+
+    fresh, repeated, seen = [], [], set()
+    for index, item in chunk:
+        if item.client_id in order_ids:
+            results.append(OrderBatchResult(index=index, client_id=item.client_id, status="duplicate",
+                                            order_id=order_ids[item.client_id]))
+        elif item.client_id in seen:
+            repeated.append((index, item))
+        else:
+            seen.add(item.client_id)
+            fresh.append((index, item))
+
+    products = await load_products(db, {product_id for _, item in fresh for product_id in item.items})
+    valid = []
+    for index, item in fresh:
+        missing = sorted(set(item.items) - products.keys())
+        if missing:
+            results.append(OrderBatchResult(index=index, client_id=item.client_id, status="error",
+                                            detail={"message": "Products not found", "product_ids": missing}))
+            continue
+        try:
+            reserved = await reserve_stock(db, Counter(item.items), products)
+        except HTTPException as e:
+            results.append(OrderBatchResult(index=index, client_id=item.client_id, status="error", detail=e.detail))
+            continue
+        valid.append((index, item, reserved))
+
+    db_orders = [Order(items=item.items, client_id=item.client_id, created_by=user_id) for _, item, _ in valid]
+    db.add_all(db_orders)
+    await db.flush()
+
+    lines_by_day = defaultdict(list)
+    orders_by_day = Counter()
+    all_lines = []
+    for db_order, (index, item, reserved) in zip(db_orders, valid):
+        lines = build_order_lines(db_order.id, Counter(item.items), products, reserved)
+        db_order.total_amount = sum(line["line_total"] for line in lines)
+        all_lines += lines
+        lines_by_day[db_order.created_at.date()] += lines
+        orders_by_day[db_order.created_at.date()] += 1
+        order_ids[item.client_id] = db_order.id
+        results.append(OrderBatchResult(index=index, client_id=item.client_id, status="created",
+                                        order_id=db_order.id))
+
+    if all_lines:
+        await db.execute(insert(OrderDetail), all_lines)
+    for day, lines in lines_by_day.items():
+        await add_to_sales_rollups(db, day, lines, orders=orders_by_day[day])
+    await db.commit()
+
+    for index, item in repeated:
+        results.append(OrderBatchResult(index=index, client_id=item.client_id, status="duplicate",
+                                        order_id=order_ids.get(item.client_id)))
+    return results
+
+
+async def create_orders_batch(orders: AsyncIterator, user_id: int, chunk_size: int):
+    """Ingest ``(index, order)`` pairs, ``chunk_size`` orders per transaction.
+
+    An order is either a decoded dict or a raw JSON line. Each chunk takes the
+    writer for its own transaction only, so a slow upload does not block other writes.
+    """
+    results = []
+    chunk = []
+
+    async def flush():
+        async with writer_session() as db:
+            try:
+                results.extend(await create_order_chunk(db, chunk, user_id))
+            except IntegrityError:
+                # a concurrent batch committed one of our client IDs first; retry sees it as a duplicate
+                await db.rollback()
+                results.extend(await create_order_chunk(db, chunk, user_id))
+        chunk.clear()
+
+    async for index, raw in orders:
+        try:
+            if isinstance(raw, str):
+                chunk.append((index, OrderBatchItem.model_validate_json(raw)))
+            else:
+                chunk.append((index, OrderBatchItem.model_validate(raw)))
+        except ValidationError as e:
+            results.append(OrderBatchResult(
+                index=index,
+                client_id=raw.get("client_id") if isinstance(raw, dict) else None,
+                status="error",
+                detail=e.errors(include_url=False, include_context=False, include_input=False),
+            ))
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    if chunk:
+        await flush()
+
+    return sorted(results, key=lambda result: result.index)
+
+
+async def get_orders(
+        db: AsyncSession,
+        limit: int,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+        status: Optional[str] = None,
+        created_from: Optional[datetime.datetime] = None,
+        created_to: Optional[datetime.datetime] = None,
+        product_id: Optional[int] = None,
+        descending: bool = False,
+):
     stmt = select(Order).filter_by(created_by=user_id) if user_id else select(Order)
-    result = await db.execute(stmt)
-    orders = result.scalars().all()
-    return orders if orders else []
+    if created_from:
+        stmt = stmt.where(Order.created_at >= to_naive_utc(created_from))
+    if created_to:
+        stmt = stmt.where(Order.created_at < to_naive_utc(created_to))
+    if status:
+        stmt = stmt.where(Order.order_details.any(OrderDetail.status == status))
+    if product_id:
+        stmt = stmt.where(Order.order_details.any(OrderDetail.product_id == product_id))
+    return await paginate(db, stmt, Order, limit, cursor, descending)
 
 
 async def get_order(db: AsyncSession, order_id: int):
@@ -56,13 +232,175 @@ async def update_order(db: AsyncSession, order_id: int, order: OrderUpdate):
     for key, value in order.model_dump(exclude_unset=True).items():
         setattr(db_order, key, value)
 
+    if order.items is not None:
+        await remove_order_lines(db, db_order)
+        await add_order_lines(db, db_order, order.items)
+
     await db.commit()
+    await db.refresh(db_order)
 
     return db_order
 
 
+ORDER_STATUS_TRANSITIONS = {
+    "pending": {"picking", "cancelled"},
+    "picking": {"completed", "cancelled"},
+}
+
+
+def statuses_leading_to(status: str) -> list[str]:
+    return [current for current, targets in ORDER_STATUS_TRANSITIONS.items() if status in targets]
+
+
+def count_status(status: str):
+    return func.sum(case((OrderDetail.status == status, 1), else_=0))
+
+
+async def get_order_statuses(db: AsyncSession, order_ids: list[int], user_id: Optional[int] = None):
+    """Aggregated line status per order in one grouped query over ``order_detail`` columns only."""
+    lines = func.count(OrderDetail.id)
+    pending, picking = count_status("pending"), count_status("picking")
+    completed, cancelled = count_status("completed"), count_status("cancelled")
+    stmt = (
+        select(
+            OrderDetail.order_id,
+            case(
+                (pending == lines, "pending"),
+                (picking == lines, "picking"),
+                (completed == lines, "completed"),
+                (cancelled == lines, "cancelled"),
+                (pending + picking > 0, "in_progress"),
+                else_="partially_completed",
+            ).label("status"),
+            lines.label("lines"),
+            pending.label("pending"),
+            picking.label("picking"),
+            completed.label("completed"),
+            cancelled.label("cancelled"),
+        )
+        .where(OrderDetail.order_id.in_(set(order_ids)))
+        .group_by(OrderDetail.order_id)
+    )
+    if user_id:
+        stmt = stmt.where(OrderDetail.order_id.in_(
+            select(Order.id).where(Order.id.in_(set(order_ids)), Order.created_by == user_id)))
+
+    result = await db.execute(stmt)
+    return [OrderStatusSummary.model_validate(row) for row in result.all()]
+
+
+async def get_order_status(db: AsyncSession, order_id: int, user_id: Optional[int] = None):
+    statuses = await get_order_statuses(db, [order_id], user_id)
+    if not statuses:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return statuses[0]
+
+
+async def publish_order_statuses(db: AsyncSession, order_ids):
+    if not order_ids or not order_status_hub.subscribers:
+        return
+    owners = await db.execute(select(Order.id, Order.created_by).where(Order.id.in_(set(order_ids))))
+    owners = dict(owners.all())
+    for summary in await get_order_statuses(db, order_ids):
+        order_status_hub.publish({
+            "order_id": summary.order_id, "created_by": owners.get(summary.order_id), "status": summary.status})
+
+
+async def remove_cancelled_from_rollups(db: AsyncSession, *criteria):
+    """Take the order lines matching ``criteria``, about to be cancelled, out of the sales rollups.
+
+    An order stops counting once none of its lines is left uncancelled.
+    """
+    result = await db.execute(
+        select(OrderDetail.order_id, OrderDetail.product_id, OrderDetail.quantity, OrderDetail.line_total,
+               Order.created_at)
+        .join(Order, Order.id == OrderDetail.order_id)
+        .where(OrderDetail.status != "cancelled", *criteria)
+    )
+    rows = result.all()
+    if not rows:
+        return
+
+    order_ids = {row.order_id for row in rows}
+    still_counted = await db.execute(
+        select(OrderDetail.order_id)
+        .where(OrderDetail.order_id.in_(order_ids), OrderDetail.status != "cancelled", ~and_(*criteria))
+        .distinct()
+    )
+    still_counted = set(still_counted.scalars().all())
+
+    lines_by_day = defaultdict(list)
+    orders_by_day = defaultdict(set)
+    for row in rows:
+        day = row.created_at.date()
+        lines_by_day[day].append({"product_id": row.product_id, "quantity": row.quantity, "line_total": row.line_total})
+        if row.order_id not in still_counted:
+            orders_by_day[day].add(row.order_id)
+    for day, lines in lines_by_day.items():
+        await add_to_sales_rollups(db, day, lines, sign=-1, orders=len(orders_by_day[day]))
+
+
+async def update_order_status(db: AsyncSession, order_id: int, status: str):
+    exists = await db.execute(select(Order.id).filter_by(id=order_id))
+    if exists.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    movable = (OrderDetail.order_id == order_id, OrderDetail.status.in_(statuses_leading_to(status)))
+    if status == "cancelled":
+        await release_stock(db, *movable)
+        await remove_cancelled_from_rollups(db, *movable)
+    result = await db.execute(
+        update(OrderDetail)
+        .where(*movable)
+        .values(status=status, **({"reserved_quantity": 0} if status == "completed" else {}))
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=409, detail=f"No line of the order can move to {status}")
+    await db.commit()
+
+    await publish_order_statuses(db, [order_id])
+    return await get_order_status(db, order_id)
+
+
+async def expire_reservations(db: AsyncSession) -> list[int]:
+    """Cancel lines still pending after the reservation timeout and release their stock.
+
+    Only lines that hold a reservation expire; lines of untracked products
+    reserved nothing and stay pending. Returns the ids of the affected orders.
+    """
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=STOCK_RESERVATION_TIMEOUT_SECONDS)
+    result = await db.execute(
+        select(OrderDetail.id, OrderDetail.order_id)
+        .where(OrderDetail.status == "pending", OrderDetail.created_at < cutoff, OrderDetail.reserved_quantity > 0)
+    )
+    rows = result.all()
+    if not rows:
+        return []
+
+    # by id, since releasing the stock clears the reserved quantity the sweep selects on
+    expired = (OrderDetail.id.in_([detail_id for detail_id, _ in rows]), OrderDetail.status == "pending")
+    await release_stock(db, *expired)
+    await remove_cancelled_from_rollups(db, *expired)
+    await db.execute(update(OrderDetail).where(*expired).values(status="cancelled")
+                     .execution_options(synchronize_session=False))
+    await db.commit()
+    return sorted({order_id for _, order_id in rows})
+
+
+async def expire_reservations_forever():
+    while True:
+        await asyncio.sleep(STOCK_SWEEP_INTERVAL_SECONDS)
+        try:
+            async with writer_session() as session:
+                await publish_order_statuses(session, await expire_reservations(session))
+        except Exception:
+            logger.exception("Expiring stock reservations failed")
+
+
 async def delete_order(db: AsyncSession, order_id: int):
     db_order = await get_order(db, order_id)
-    await db.delete(db_order)
+    await remove_order_lines(db, db_order)
+    await db.execute(delete(Order).where(Order.id == order_id).execution_options(synchronize_session=False))
     await db.commit()
     return db_order
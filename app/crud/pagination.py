@@ -0,0 +1,59 @@
+import base64
+import binascii
+import datetime
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(created_at: datetime.datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def paginate(db: AsyncSession, stmt: Select, model, limit: int, cursor: Optional[str] = None,
+                   descending: bool = False):
+    """Keyset pagination over ``(created_at, id)`` of ``model``.
+
+    Fetches one extra row to know whether there is a next page, so every call
+    reads at most ``limit + 1`` rows no matter how large the table is.
+    """
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        if descending:
+            stmt = stmt.where(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < last_id),
+            ))
+        else:
+            stmt = stmt.where(or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, model.id > last_id),
+            ))
+    if descending:
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        stmt = stmt.order_by(model.created_at, model.id)
+    stmt = stmt.limit(limit + 1)
+
+    result = await db.execute(stmt)
+    rows = result.scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return {"items": rows, "next_cursor": next_cursor}
@@ -1,9 +1,31 @@
+import base64
+import binascii
+import csv
+import datetime
+import io
+import json
+import re
+from typing import AsyncIterator, Optional
+
 from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
+from app.cache import LRUCache
+from app.config import CATALOG_CACHE_SIZE, MAX_IMPORT_ERRORS, EXPORT_CHUNK_SIZE
+from app.database import read_session_maker, writer_session
+from app.crud.pagination import paginate
+from app.models.product import Product, ProductTombstone
+from app.schemas.pagination import Page
+from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductChanges, CatalogProduct, \
+    ProductStock
+from app.timestamps import to_naive_utc
+
+product_cache = LRUCache(CATALOG_CACHE_SIZE)
 
 
 async def create_product(db: AsyncSession, product: ProductCreate):
@@ -11,14 +33,23 @@ async def create_product(db: AsyncSession, product: ProductCreate):
     db.add(db_product)
     await db.commit()
     await db.refresh(db_product)
+    product_cache.invalidate()
 
     return db_product
 
 
-async def get_products(db: AsyncSession):
-    result = await db.execute(select(Product))
-    products = result.scalars().all()
-    return products if products else []
+async def get_products(db: AsyncSession, limit: int, cursor: Optional[str] = None):
+    return await paginate(db, select(Product), Product, limit, cursor)
+
+
+async def get_products_cached(db: AsyncSession, limit: int, cursor: Optional[str] = None):
+    key = ("products", limit, cursor)
+    page = product_cache.get(key)
+    if page is None:
+        version = product_cache.version
+        page = Page[CatalogProduct].model_validate(await get_products(db, limit, cursor), from_attributes=True)
+        product_cache.set(key, page, version)
+    return page
 
 
 async def get_product(db: AsyncSession, product_id: int):
@@ -31,17 +62,79 @@ async def get_product(db: AsyncSession, product_id: int):
     return db_product
 
 
+async def load_products(db: AsyncSession, product_ids) -> dict[int, Product]:
+    result = await db.execute(select(Product).where(Product.id.in_(set(product_ids))))
+    return {p.id: p for p in result.scalars().all()}
+
+
+async def get_products_by_ids(db: AsyncSession, product_ids):
+    """Load many products with one ``IN`` query, failing with every missing ID at once."""
+    ids = set(product_ids)
+    products = await load_products(db, ids)
+
+    missing = sorted(ids - products.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Products not found", "product_ids": missing})
+
+    return products
+
+
+async def get_product_cached(db: AsyncSession, product_id: int):
+    key = ("product", product_id)
+    product = product_cache.get(key)
+    if product is None:
+        version = product_cache.version
+        product = CatalogProduct.model_validate(await get_product(db, product_id))
+        product_cache.set(key, product, version)
+    return product
+
+
+async def get_product_stock(db: AsyncSession, product_ids) -> list[ProductStock]:
+    """Live stock of ``product_ids``, never cached since every checkout changes it."""
+    result = await db.execute(
+        select(Product.id, Product.stock).where(Product.id.in_(set(product_ids))).order_by(Product.id))
+    return [ProductStock(product_id=product_id, stock=stock) for product_id, stock in result.all()]
+
+
+def build_search_query(q: str) -> str:
+    # every word is quoted (no FTS5 operators from user input) and prefix-matched for type-ahead
+    words = re.findall(r"\w+", q)
+    if not words:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query must contain a word")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+async def search_products(db: AsyncSession, q: str, limit: int):
+    key = ("search", q, limit)
+    products = product_cache.get(key)
+    if products is None:
+        version = product_cache.version
+        stmt = select(Product).from_statement(text(
+            "SELECT product.* FROM product_search "
+            "JOIN product ON product.id = product_search.rowid "
+            "WHERE product_search MATCH :query "
+            "ORDER BY bm25(product_search, 10.0, 1.0) "
+            "LIMIT :limit"
+        ))
+        result = await db.execute(stmt, {"query": build_search_query(q), "limit": limit})
+        products = [CatalogProduct.model_validate(p) for p in result.scalars().all()]
+        product_cache.set(key, products, version)
+    return products
+
+
 async def update_product(db: AsyncSession, product_id: int, product: ProductUpdate):
 
     db_product = await get_product(db, product_id)
-    db_products = await get_products(db)
-    if product.name in [d.name for d in db_products]:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Product with this name already exists")
+    if product.name is not None:
+        existing = await db.execute(select(Product.id).filter_by(name=product.name))
+        if existing.scalar_one_or_none() not in (None, product_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Product with this name already exists")
 
     for key, value in product.model_dump(exclude_unset=True).items():
         setattr(db_product, key, value)
 
     await db.commit()
+    product_cache.invalidate()
 
     return db_product
 
@@ -49,5 +142,153 @@ async def update_product(db: AsyncSession, product_id: int, product: ProductUpda
 async def delete_product(db: AsyncSession, product_id: int):
     db_product = await get_product(db, product_id)
     await db.delete(db_product)
+    db.add(ProductTombstone(product_id=product_id))
     await db.commit()
+    product_cache.invalidate()
     return {"detail": "Product deleted successfully"}
+
+
+def encode_sync_token(since: datetime.datetime) -> str:
+    return base64.urlsafe_b64encode(since.isoformat().encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> datetime.datetime:
+    try:
+        since = datetime.datetime.fromisoformat(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode())
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    # compared with the naive UTC timestamps SQLite returns, in SQL and in Python
+    return to_naive_utc(since)
+
+
+async def get_product_changes(db: AsyncSession, since: Optional[str] = None):
+    """Products changed and deleted after ``since``; without a token this is the full catalog."""
+    products_stmt = select(Product).order_by(Product.updated_at)
+    tombstones_stmt = select(ProductTombstone.product_id, ProductTombstone.deleted_at)
+    if since:
+        since_at = decode_sync_token(since)
+        products_stmt = products_stmt.where(Product.updated_at > since_at)
+        tombstones_stmt = tombstones_stmt.where(ProductTombstone.deleted_at > since_at)
+    else:
+        since_at = datetime.datetime.min
+
+    products = (await db.execute(products_stmt)).scalars().all()
+    tombstones = (await db.execute(tombstones_stmt)).all() if since else []
+
+    # SQLite may reuse the id of a deleted product; the live product wins
+    updated_ids = {p.id for p in products}
+    latest = max([since_at] + [p.updated_at for p in products] + [t.deleted_at for t in tombstones])
+
+    return ProductChanges(
+        updated=[ProductResponse.model_validate(p) for p in products],
+        deleted=sorted({t.product_id for t in tombstones} - updated_ids),
+        token=encode_sync_token(latest),
+    )
+
+
+async def write_product_batch(db: AsyncSession, rows: list[dict]):
+    stmt = insert(Product)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Product.name],
+        set_={
+            "price": stmt.excluded.price,
+            "description": stmt.excluded.description,
+            # rows without a stock column keep the current stock
+            "stock": func.coalesce(stmt.excluded.stock, Product.stock),
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt, rows)
+    await db.commit()
+
+
+async def import_products(lines: AsyncIterator[str], fmt: str, batch_size: int):
+    """Upsert products by name from CSV (with a header row) or NDJSON lines.
+
+    Rows are validated with ``ProductCreate`` and written ``batch_size`` at a time,
+    one transaction per batch, so only the current batch is kept in memory.
+    Each batch takes the writer for its own transaction only; reading and
+    parsing the body happen without holding it.
+    """
+    report = {"processed": 0, "imported": 0, "error_count": 0, "errors": []}
+
+    def add_error(line_numbers, errors):
+        report["error_count"] += len(line_numbers)
+        for line_no in line_numbers:
+            if len(report["errors"]) < MAX_IMPORT_ERRORS:
+                report["errors"].append({"line": line_no, "errors": errors})
+
+    async def flush():
+        async with writer_session() as db:
+            try:
+                await write_product_batch(db, batch)
+                report["imported"] += len(batch)
+            except SQLAlchemyError as e:
+                await db.rollback()
+                add_error(batch_lines, [str(e.orig if getattr(e, "orig", None) else e)])
+        product_cache.invalidate()
+        batch.clear()
+        batch_lines.clear()
+
+    batch, batch_lines = [], []
+    header = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+
+        report["processed"] += 1
+        try:
+            if fmt == "csv":
+                # empty cells mean "not given", e.g. no stock tracking
+                row = {name: value for name, value in zip(header, next(csv.reader([line]))) if value != ""}
+            else:
+                row = json.loads(line)
+            batch.append(ProductCreate.model_validate(row).model_dump())
+            batch_lines.append(line_no)
+        except ValidationError as e:
+            add_error([line_no], [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()])
+        except (ValueError, csv.Error) as e:
+            add_error([line_no], [str(e)])
+
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+
+    return report
+
+
+EXPORT_FIELDS = ["id", "name", "price", "description", "stock", "created_at", "updated_at"]
+
+
+async def export_products(fmt: str) -> AsyncIterator[str]:
+    """Yield the whole catalog as CSV or NDJSON text, ``EXPORT_CHUNK_SIZE`` rows per chunk.
+
+    Opens its own session: the response is streamed after the request's session is closed.
+    """
+    async with read_session_maker() as session:
+        result = await session.stream(
+            select(Product).order_by(Product.id).execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            yield buffer.getvalue()
+
+        async for products in result.scalars().partitions():
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for p in products:
+                    writer.writerow([getattr(p, field) for field in EXPORT_FIELDS])
+                chunk = buffer.getvalue()
+            else:
+                chunk = "".join(ProductResponse.model_validate(p).model_dump_json() + "\n" for p in products)
+            yield chunk
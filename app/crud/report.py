@@ -0,0 +1,106 @@
+import datetime
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models.report import SalesDaily, SalesProductDaily
+from app.schemas.report import SalesReport
+
+
+async def add_to_sales_rollups(db: AsyncSession, day: datetime.date, lines: list[dict], sign: int = 1,
+                               orders: int = 1):
+    """Add (``sign=1``) or remove (``sign=-1``) the lines of ``orders`` orders in the rollups.
+
+    Runs in the caller's transaction, so the rollups commit together with the order.
+    """
+    daily = insert(SalesDaily).values(
+        day=day,
+        order_count=sign * orders,
+        units=sign * sum(line["quantity"] for line in lines),
+        revenue=sign * sum(line["line_total"] for line in lines),
+    )
+    daily = daily.on_conflict_do_update(
+        index_elements=[SalesDaily.day],
+        set_={
+            "order_count": SalesDaily.order_count + daily.excluded.order_count,
+            "units": SalesDaily.units + daily.excluded.units,
+            "revenue": SalesDaily.revenue + daily.excluded.revenue,
+        },
+    )
+    await db.execute(daily)
+
+    if not lines:
+        return
+    per_product = insert(SalesProductDaily)
+    per_product = per_product.on_conflict_do_update(
+        index_elements=[SalesProductDaily.day, SalesProductDaily.product_id],
+        set_={
+            "units": SalesProductDaily.units + per_product.excluded.units,
+            "revenue": SalesProductDaily.revenue + per_product.excluded.revenue,
+        },
+    )
+    await db.execute(per_product, [
+        {"day": day, "product_id": line["product_id"],
+         "units": sign * line["quantity"], "revenue": sign * line["line_total"]}
+        for line in lines
+    ])
+
+
+# archived orders keep counting in the rollups, so rebuilds read both the live and the archive tables
+ALL_ORDERS = """
+    WITH o AS (SELECT id, created_at FROM "order" UNION ALL SELECT id, created_at FROM order_archive),
+         d AS (SELECT id, order_id, product_id, quantity, line_total, status FROM order_detail
+               UNION ALL SELECT id, order_id, product_id, quantity, line_total, status FROM order_detail_archive)
+"""
+
+
+async def rebuild_sales_rollups(db: AsyncSession):
+    await db.execute(delete(SalesProductDaily))
+    await db.execute(delete(SalesDaily))
+    await db.execute(text(ALL_ORDERS + """
+        INSERT INTO sales_daily (day, order_count, units, revenue)
+        SELECT date(o.created_at), count(DISTINCT o.id), coalesce(sum(d.quantity), 0), coalesce(sum(d.line_total), 0)
+        FROM o LEFT JOIN d ON d.order_id = o.id AND d.status != 'cancelled'
+        -- orders whose every line was cancelled no longer count
+        WHERE d.id IS NOT NULL OR NOT EXISTS (SELECT 1 FROM d AS c WHERE c.order_id = o.id)
+        GROUP BY date(o.created_at)
+    """))
+    await db.execute(text(ALL_ORDERS + """
+        INSERT INTO sales_product_daily (day, product_id, units, revenue)
+        SELECT date(o.created_at), d.product_id, sum(d.quantity), sum(d.line_total)
+        FROM d JOIN o ON o.id = d.order_id
+        WHERE d.status != 'cancelled'
+        GROUP BY date(o.created_at), d.product_id
+    """))
+    await db.commit()
+    return {"detail": "Sales rollups rebuilt successfully"}
+
+
+async def get_sales_report(db: AsyncSession, date_from: datetime.date, date_to: datetime.date, top: int):
+    in_range = SalesDaily.day.between(date_from, date_to)
+    days = (await db.execute(select(SalesDaily).where(in_range).order_by(SalesDaily.day))).scalars().all()
+
+    top_products = await db.execute(
+        select(
+            SalesProductDaily.product_id,
+            func.sum(SalesProductDaily.units).label("units"),
+            func.sum(SalesProductDaily.revenue).label("revenue"),
+        )
+        .where(SalesProductDaily.day.between(date_from, date_to))
+        .group_by(SalesProductDaily.product_id)
+        .having(func.sum(SalesProductDaily.units) != 0)
+        .order_by(func.sum(SalesProductDaily.revenue).desc())
+        .limit(top)
+    )
+
+    return SalesReport(
+        date_from=date_from,
+        date_to=date_to,
+        order_count=sum(d.order_count for d in days),
+        units=sum(d.units for d in days),
+        revenue=sum(d.revenue for d in days),
+        days=days,
+        top_products=top_products.all(),
+    )
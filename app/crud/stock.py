@@ -0,0 +1,60 @@
+from fastapi import HTTPException, status
+from sqlalchemy import case, exists, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from app.models.order import OrderDetail
+from app.models.product import Product
+
+
+async def reserve_stock(db: AsyncSession, quantities: dict[int, int], products: dict[int, Product]) -> dict[int, int]:
+    """Take ``quantities`` out of stock for every tracked product, or for none of them.
+
+    One conditional ``UPDATE`` decrements all lines and only matches when no
+    line is short, so concurrent checkouts can never oversell. Products with
+    ``stock = NULL`` are not tracked. Returns the reserved quantity per product.
+    """
+    tracked = {product_id: quantity for product_id, quantity in quantities.items()
+               if products[product_id].stock is not None}
+    if not tracked:
+        return {}
+
+    other = aliased(Product)
+    result = await db.execute(
+        update(Product)
+        .where(
+            Product.id.in_(tracked),
+            ~exists().where(other.id.in_(tracked), other.stock < case(tracked, value=other.id)),
+        )
+        .values(stock=Product.stock - case(tracked, value=Product.id))
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        available = await db.execute(select(Product.id, Product.stock).where(Product.id.in_(tracked)))
+        short = {product_id: stock for product_id, stock in available.all()
+                 if stock is not None and stock < tracked[product_id]}
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail={"message": "Insufficient stock", "available": short})
+
+    return tracked
+
+
+async def release_stock(db: AsyncSession, *criteria):
+    """Put the reserved quantity of the order lines matching ``criteria`` back into stock."""
+    reserved = OrderDetail.reserved_quantity > 0
+    returned = (
+        select(func.sum(OrderDetail.reserved_quantity))
+        .where(OrderDetail.product_id == Product.id, reserved, *criteria)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(Product)
+        .where(Product.id.in_(select(OrderDetail.product_id).where(reserved, *criteria)))
+        .values(stock=Product.stock + returned)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(OrderDetail).where(reserved, *criteria).values(reserved_quantity=0)
+        .execution_options(synchronize_session=False)
+    )
@@ -1,29 +1,115 @@
-from typing import AsyncGenerator, Annotated
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Annotated
 
 from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import CreateIndex
 
-DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+from app.config import DATABASE_URL, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, SQLITE_PROFILE, \
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
+from app.migrations import run_migrations
+from app.sqltrace import instrument_engine
 
 
 class Base(DeclarativeBase):
     pass
 
 
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# aiosqlite defaults to NullPool, which opens a new connection (and file handle) for every session.
+# SQLite has a single writer, so writes share one connection and queue on write_lock instead of
+# racing for the file lock; reads get their own pool and run in parallel under WAL.
 engine = create_async_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    echo=DB_ECHO,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1 if IS_SQLITE else DB_POOL_SIZE,
+    max_overflow=0 if IS_SQLITE else DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
 )
 
+read_engine = create_async_engine(
+    DATABASE_URL,
+    echo=DB_ECHO,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+) if IS_SQLITE else engine
+
+write_lock = asyncio.Lock()
+
+SQLITE_PRAGMAS = {
+    # readers no longer block the writer, and commits append to the WAL instead of rewriting pages
+    "journal_mode": "WAL",
+    # with WAL, NORMAL only risks the last commits on power loss, never corruption
+    "synchronous": "NORMAL",
+    # wait for the write lock instead of failing with "database is locked"
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    # a negative cache_size is in KiB rather than pages
+    "cache_size": -SQLITE_CACHE_SIZE_KB,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": "MEMORY",
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def set_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+if IS_SQLITE:
+    if SQLITE_PROFILE == "tuned":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+        event.listen(read_engine.sync_engine, "connect", set_sqlite_pragmas)
+    # a write through a read session fails loudly instead of bypassing the writer queue
+    event.listen(read_engine.sync_engine, "connect", set_query_only)
+
+instrument_engine(engine.sync_engine)
+if read_engine is not engine:
+    instrument_engine(read_engine.sync_engine)
+
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+read_session_maker = async_sessionmaker(read_engine, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def writer_session() -> AsyncIterator[AsyncSession]:
+    """A session on the writer connection, held exclusively until the block exits."""
+    async with write_lock:
+        async with async_session_maker() as session:
+            yield session
+
+def create_missing_indexes(connection):
+    # create_all() skips tables that already exist, so indexes added to a model later are created here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
 
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        await conn.run_sync(create_missing_indexes)
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+    async with writer_session() as session:
         try:
             yield session
         except Exception as e:
@@ -33,4 +119,15 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
-get_session = Annotated[AsyncSession, Depends(get_async_session)]
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+write_session = Annotated[AsyncSession, Depends(get_async_session)]
+read_session = Annotated[AsyncSession, Depends(get_read_session)]
+# kept for code that has not declared which kind of session it needs
+get_session = write_session
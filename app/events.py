@@ -0,0 +1,51 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.config import EVENT_QUEUE_SIZE
+
+
+@dataclass(eq=False)
+class Subscription:
+    order_ids: Optional[set[int]] = None
+    user_id: Optional[int] = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(EVENT_QUEUE_SIZE))
+
+    def matches(self, event: dict) -> bool:
+        if self.user_id is not None and event["created_by"] != self.user_id:
+            return False
+        return self.order_ids is None or event["order_id"] in self.order_ids
+
+
+class OrderStatusHub:
+    """In-process pub/sub for order status changes.
+
+    Each subscriber gets a bounded queue; a subscriber that stops reading loses
+    its oldest events instead of slowing down the publishers.
+    """
+
+    def __init__(self):
+        self._subscriptions: set[Subscription] = set()
+
+    def subscribe(self, order_ids: Optional[set[int]] = None, user_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(order_ids=order_ids, user_id=user_id)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, event: dict):
+        for subscription in self._subscriptions:
+            if not subscription.matches(event):
+                continue
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(event)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscriptions)
+
+
+order_status_hub = OrderStatusHub()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.future import select
+
+from app.config import FULFILMENT_WORKERS, FULFILMENT_BATCH_SIZE, FULFILMENT_QUEUE_SIZE, FULFILMENT_MAX_RETRIES, \
+    FULFILMENT_RETRY_BACKOFF_SECONDS
+from app.crud.order import ORDER_STATUS_TRANSITIONS, publish_order_statuses
+from app.database import read_session_maker, writer_session
+from app.models.order import OrderDetail
+
+logger = logging.getLogger(__name__)
+
+# the transitions the queue applies and the status lines move from; cancelling goes through
+# update_order_status since it also returns stock and adjusts the sales rollups
+FROM_STATUS = {
+    "picking": "pending",
+    "completed": "picking",
+}
+
+
+@dataclass
+class FulfilmentJob:
+    detail_ids: list[int]
+    from_status: str
+    to_status: str
+    attempts: int = 0
+
+
+class FulfilmentQueue:
+    """asyncio job queue that moves order lines through the fulfilment states.
+
+    Transitions are requested per order (``request()``, e.g. when the warehouse
+    starts or finishes picking) and split into batches; workers apply each batch
+    with a single ``UPDATE ... WHERE id IN (...) AND status = :from_status``, so
+    lines already moved by someone else (another process, an admin) are skipped.
+    """
+
+    def __init__(
+            self,
+            workers: int = FULFILMENT_WORKERS,
+            batch_size: int = FULFILMENT_BATCH_SIZE,
+            maxsize: int = FULFILMENT_QUEUE_SIZE,
+            max_retries: int = FULFILMENT_MAX_RETRIES,
+            retry_backoff: float = FULFILMENT_RETRY_BACKOFF_SECONDS,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue: asyncio.Queue[FulfilmentJob] = asyncio.Queue(maxsize)
+        self.processed = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self._claimed: set[int] = set()
+        self._recent: deque[tuple[float, int]] = deque()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, detail_ids: list[int], from_status: str, to_status: str):
+        if to_status not in ORDER_STATUS_TRANSITIONS.get(from_status, ()):
+            raise ValueError(f"Order lines cannot move from {from_status} to {to_status}")
+        for start in range(0, len(detail_ids), self.batch_size):
+            batch = detail_ids[start:start + self.batch_size]
+            self._claimed.update(batch)
+            await self.queue.put(FulfilmentJob(batch, from_status, to_status))
+
+    async def request(self, order_ids: list[int], to_status: str) -> int:
+        """Queue the lines of ``order_ids`` that can move to ``to_status``; returns how many were queued."""
+        async with read_session_maker() as session:
+            result = await session.execute(
+                select(OrderDetail.id)
+                .where(OrderDetail.order_id.in_(order_ids), OrderDetail.status == FROM_STATUS[to_status])
+                .order_by(OrderDetail.id)
+            )
+            detail_ids = [detail_id for detail_id in result.scalars().all() if detail_id not in self._claimed]
+
+        jobs = -(-len(detail_ids) // self.batch_size)
+        if jobs > self.queue.maxsize - self.queue.qsize():
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="The fulfilment queue is full, try again later", headers={"Retry-After": "1"})
+        await self.submit(detail_ids, FROM_STATUS[to_status], to_status)
+        return len(detail_ids)
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._apply(job)
+            except SQLAlchemyError:
+                self._retry(job)
+            except Exception:
+                logger.exception("Fulfilment job failed")
+                self._release(job)
+            finally:
+                self.queue.task_done()
+
+    async def _apply(self, job: FulfilmentJob):
+        async with writer_session() as session:
+            result = await session.execute(
+                update(OrderDetail)
+                .where(OrderDetail.id.in_(job.detail_ids), OrderDetail.status == job.from_status)
+                .values(status=job.to_status, **({"reserved_quantity": 0} if job.to_status == "completed" else {}))
+                .returning(OrderDetail.id, OrderDetail.order_id)
+                .execution_options(synchronize_session=False)
+            )
+            moved = result.all()
+            await session.commit()
+            await publish_order_statuses(session, {order_id for _, order_id in moved})
+
+        self._release(job)
+        self.processed += len(moved)
+        self.batches += 1
+        self._recent.append((time.monotonic(), len(moved)))
+
+    def _retry(self, job: FulfilmentJob):
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            logger.error("Giving up on order lines %s after %d attempts", job.detail_ids, job.attempts)
+            self.failed += len(job.detail_ids)
+            self._release(job)
+            return
+        self.retries += 1
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        asyncio.get_running_loop().call_later(delay, self._requeue, job)
+
+    def _requeue(self, job: FulfilmentJob):
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # the lines keep their status and can be requested again
+            self._release(job)
+
+    def _release(self, job: FulfilmentJob):
+        self._claimed.difference_update(job.detail_ids)
+
+    def throughput(self, window: float = 60.0) -> float:
+        """Order lines moved per second over the last ``window`` seconds."""
+        now = time.monotonic()
+        while self._recent and self._recent[0][0] < now - window:
+            self._recent.popleft()
+        return sum(n for _, n in self._recent) / window
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "depth": self.queue.qsize(),
+            "claimed": len(self._claimed),
+            "processed": self.processed,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+            "throughput": self.throughput(),
+        }
+
+
+fulfilment_queue: Optional[FulfilmentQueue] = FulfilmentQueue() if FULFILMENT_WORKERS > 0 else None
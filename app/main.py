@@ -1,23 +1,69 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from app.auth.hashing import password_hash_pool
+from app.auth.revocation import revocation_store
 from app.auth.superuser import create_superuser
-from app.database import create_tables
+from app.auth.utils import principal_cache
+from app.config import ARCHIVE_INTERVAL_SECONDS, LOG_LEVEL
+from app.crud.archive import archive_orders_forever
+from app.crud.idempotency import prune_idempotency_keys_forever
+from app.crud.order import expire_reservations_forever
+from app.crud.product import product_cache
+from app.database import create_tables, engine, read_engine
+from app.events import order_status_hub
+from app.fulfilment import fulfilment_queue
+from app.metrics import registry, MetricsMiddleware
+from app.ratelimit import RateLimitMiddleware, rate_limit_buckets
+from app.sqltrace import QueryTimingMiddleware
 from app import router
 
 
+def configure_logging():
+    """Emit the app's logs, e.g. the per-request SQL trace lines, which no one else configures."""
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    # leave them to the root logger when the deployment configured one
+    if not logging.getLogger().handlers and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+
+
+configure_logging()
+
 
 @asynccontextmanager
 async def lifespan(main_app: FastAPI):
     await create_tables()
     await create_superuser()
+    await revocation_store.sync()
+    tasks = [
+        asyncio.create_task(revocation_store.sync_forever()),
+        asyncio.create_task(prune_idempotency_keys_forever()),
+        asyncio.create_task(expire_reservations_forever()),
+    ]
+    if registry.multiproc_dir:
+        tasks.append(asyncio.create_task(registry.write_snapshots_forever()))
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(archive_orders_forever()))
+    if fulfilment_queue:
+        await fulfilment_queue.start()
 
     try:
         yield
     finally:
-        pass
+        if fulfilment_queue:
+            await fulfilment_queue.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        password_hash_pool.shutdown()
 
 
 app = FastAPI(
@@ -28,6 +74,11 @@ app = FastAPI(
 )
 
 
+# middleware added first runs innermost: requests rejected by the rate limiter are not traced but
+# are counted in the metrics, and CORS wraps everything so that 429 responses still carry CORS headers
+app.add_middleware(QueryTimingMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -39,3 +90,36 @@ app.add_middleware(
 
 app.include_router(router)
 
+
+CACHES = {"catalog": product_cache, "principal": principal_cache}
+ENGINES = {"write": engine, "read": read_engine} if read_engine is not engine else {"write": engine}
+
+registry.callback("cache_hits_total", "Cache lookups that found an entry",
+                  lambda: {(name,): cache.hits for name, cache in CACHES.items()}, "counter", ("cache",))
+registry.callback("cache_misses_total", "Cache lookups that missed",
+                  lambda: {(name,): cache.misses for name, cache in CACHES.items()}, "counter", ("cache",))
+registry.callback("cache_entries", "Entries held in the cache",
+                  lambda: {(name,): cache.stats()["size"] for name, cache in CACHES.items()}, labelnames=("cache",))
+registry.callback("db_pool_checked_out", "Database connections in use",
+                  lambda: {(name,): db.pool.checkedout() for name, db in ENGINES.items()}, labelnames=("engine",))
+registry.callback("password_hash_pending", "Password hashes running or waiting for a thread",
+                  lambda: password_hash_pool.pending)
+registry.callback("password_hash_rejected_total", "Password hashes refused because the pool was full",
+                  lambda: password_hash_pool.rejected, "counter")
+registry.callback("rate_limit_rejected_total", "Requests refused by the rate limiter",
+                  lambda: rate_limit_buckets.rejected, "counter")
+registry.callback("order_status_subscribers", "Open order status event streams",
+                  lambda: order_status_hub.subscribers)
+if fulfilment_queue:
+    registry.callback("fulfilment_queue_depth", "Fulfilment jobs waiting for a worker",
+                      lambda: fulfilment_queue.queue.qsize())
+    registry.callback("fulfilment_lines_processed_total", "Order lines moved by the fulfilment workers",
+                      lambda: fulfilment_queue.processed, "counter")
+    registry.callback("fulfilment_lines_failed_total", "Order lines the fulfilment workers gave up on",
+                      lambda: fulfilment_queue.failed, "counter")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
@@ -0,0 +1,39 @@
+"""Admin commands, e.g. ``python -m app.manage rebuild-rollups`` or ``python -m app.manage archive-orders --older-than-days 30``."""
+import argparse
+import asyncio
+
+from app import router  # noqa: F401  registers every model
+from app.database import writer_session, create_tables
+from app.config import ARCHIVE_AFTER_DAYS
+from app.crud.archive import archive_orders
+from app.crud.report import rebuild_sales_rollups
+
+
+async def rebuild_rollups(args):
+    async with writer_session() as session:
+        print((await rebuild_sales_rollups(session))["detail"])
+
+
+async def archive_old_orders(args):
+    async with writer_session() as session:
+        result = await archive_orders(session, args.older_than_days)
+    print(f"Archived {result['archived']} orders")
+
+
+COMMANDS = {
+    "rebuild-rollups": rebuild_rollups,
+    "archive-orders": archive_old_orders,
+}
+
+
+async def main(args):
+    await create_tables()
+    await COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NewEra Cash and Carry admin commands")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive-orders: move finished orders created more than this many days ago")
+    asyncio.run(main(parser.parse_args()))
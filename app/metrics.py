@@ -0,0 +1,230 @@
+import asyncio
+import bisect
+import glob
+import json
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import METRICS_MULTIPROC_DIR, METRICS_SNAPSHOT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    def __init__(self, name: str, help: str, type: str, labelnames: tuple = (), buckets: tuple = ()):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.samples: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.samples[labels] = self.samples.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.samples[labels] = self.samples.get(labels, 0) - amount
+
+    def set(self, value: float, *labels):
+        self.samples[labels] = value
+
+    def snapshot(self) -> dict:
+        return {"help": self.help, "type": self.type, "labelnames": list(self.labelnames),
+                "buckets": list(self.buckets), "samples": [[list(labels), value] for labels, value in self.samples.items()]}
+
+
+class Histogram(Metric):
+    """Histogram with its bucket counters allocated once per label set; ``observe`` is a bisect and two adds."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, "histogram", labelnames, buckets)
+        self.samples: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        sample = self.samples.get(labels)
+        if sample is None:
+            # one counter per bucket plus +Inf, then the sum
+            sample = self.samples[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        sample[bisect.bisect_left(self.buckets, value)] += 1
+        sample[-1] += value
+
+
+class CallbackMetric(Metric):
+    """Read from ``func`` at collection time, for values other parts of the app already keep.
+
+    ``func`` returns a number, or a dict from label-value tuples to numbers.
+    """
+
+    def __init__(self, name: str, help: str, type: str, func: Callable, labelnames: tuple = ()):
+        super().__init__(name, help, type, labelnames)
+        self.func = func
+
+    def snapshot(self) -> dict:
+        try:
+            values = self.func()
+        except Exception:
+            logger.exception("Collecting metric %s failed", self.name)
+            values = {}
+        self.samples = values if isinstance(values, dict) else {(): values}
+        return super().snapshot()
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir: Optional[str] = METRICS_MULTIPROC_DIR):
+        self.metrics: dict[str, Metric] = {}
+        self.multiproc_dir = multiproc_dir
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Metric:
+        return self.register(Metric(name, help, "counter", labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Metric:
+        return self.register(Metric(name, help, "gauge", labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, func: Callable, type: str = "gauge", labelnames: tuple = ()) -> Metric:
+        return self.register(CallbackMetric(name, help, type, func, labelnames))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def write_snapshot(self):
+        path = os.path.join(self.multiproc_dir, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as file:
+            json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, file)
+        os.replace(f"{path}.tmp", path)
+
+    async def write_snapshots_forever(self):
+        while True:
+            await asyncio.sleep(METRICS_SNAPSHOT_SECONDS)
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.exception("Writing the metrics snapshot failed")
+
+    def collect(self) -> dict:
+        """This process's metrics, or with a multiprocess directory the merge of every worker's snapshot.
+
+        Counters and histograms are summed over all snapshots, including those
+        of exited workers so that totals never go backwards; gauges only count
+        live workers.
+        """
+        if not self.multiproc_dir:
+            return self.snapshot()
+
+        self.write_snapshot()
+        merged: dict[str, dict] = {}
+        for path in glob.glob(os.path.join(self.multiproc_dir, "*.json")):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            alive = pid_alive(snapshot["pid"])
+            for name, metric in snapshot["metrics"].items():
+                if metric["type"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    if key not in target["samples"]:
+                        target["samples"][key] = value
+                    elif isinstance(value, list):
+                        target["samples"][key] = [a + b for a, b in zip(target["samples"][key], value)]
+                    else:
+                        target["samples"][key] += value
+        for metric in merged.values():
+            metric["samples"] = [[list(labels), value] for labels, value in metric["samples"].items()]
+        return merged
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in metric["samples"]:
+                pairs = list(zip(metric["labelnames"], labels))
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{format_labels(pairs)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip([*metric["buckets"], "+Inf"], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(pairs + [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(pairs)} {value[-1]}")
+                lines.append(f"{name}_count{format_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status",
+                                 ("method", "route", "status"))
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served", ("method",))
+http_duration = registry.histogram("http_request_duration_seconds", "HTTP request latency by route",
+                                   ("method", "route"))
+
+
+class MetricsMiddleware:
+    """Per-route request counts, status codes, in-flight requests and latency histograms.
+
+    Routes are labelled by their template (``/orders/{order_id}``), which is
+    only known once the router has matched, so in-flight requests are counted
+    per method. Unmatched paths share one label to keep the series count bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status_code = 500
+        http_in_flight.inc(method)
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = route.path_format if route is not None else "unmatched"
+            http_in_flight.dec(method)
+            http_requests.inc(method, path, str(status_code))
+            http_duration.observe(time.perf_counter() - started, method, path)
@@ -0,0 +1,119 @@
+"""Upgrades for databases created before a model change.
+
+``create_all()`` only creates missing tables, so columns added to existing
+tables are added here. Every migration must be safe to run on each startup.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateTable
+
+
+def add_missing_columns(connection, table: str, columns: dict[str, str]) -> list[str]:
+    existing = {column["name"] for column in inspect(connection).get_columns(table)}
+    added = []
+    for name, ddl in columns.items():
+        if name not in existing:
+            connection.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}')
+            added.append(name)
+    return added
+
+
+def add_autoincrement(connection, table: str, used_by: tuple[str, ...] = ()) -> bool:
+    """Rebuild ``table`` with ``AUTOINCREMENT`` so that ids of deleted rows are never handed out again.
+
+    Without it SQLite reuses ``max(rowid) + 1`` once the highest row is deleted.
+    ``used_by`` names tables whose ids were taken from ``table`` (archives), so
+    the sequence also starts past them. Indexes are recreated by
+    ``create_missing_indexes`` afterwards. Must run after the column migrations.
+    """
+    from app.database import Base  # the models are registered by the time migrations run
+
+    sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return False
+
+    model = Base.metadata.tables[table]
+    create = str(CreateTable(model).compile(connection))
+    quoted = connection.dialect.identifier_preparer.format_table(model)
+    columns = ", ".join(f'"{column.name}"' for column in model.columns)
+    connection.exec_driver_sql(create.replace(f"CREATE TABLE {quoted}", f'CREATE TABLE "{table}_rebuilt"', 1))
+    connection.exec_driver_sql(f'INSERT INTO "{table}_rebuilt" ({columns}) SELECT {columns} FROM "{table}"')
+    connection.exec_driver_sql(f'DROP TABLE "{table}"')
+    connection.exec_driver_sql(f'ALTER TABLE "{table}_rebuilt" RENAME TO "{table}"')
+
+    highest = max(
+        connection.exec_driver_sql(f'SELECT coalesce(max(id), 0) FROM "{name}"').scalar()
+        for name in (table, *used_by)
+    )
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+    connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, highest))
+    return True
+
+
+def migrate_order_lines(connection):
+    """Typed order line columns, backfilled from the ``product_detail`` JSON."""
+    add_missing_columns(connection, "order_detail", {
+        "product_id": "INTEGER REFERENCES product (id)",
+        "quantity": "INTEGER NOT NULL DEFAULT 1",
+        "unit_price": "FLOAT",
+        "line_total": "FLOAT",
+    })
+    connection.exec_driver_sql("""
+        UPDATE order_detail SET
+            product_id = json_extract(product_detail, '$.product_id'),
+            quantity = coalesce(json_extract(product_detail, '$.quantity'), 1),
+            unit_price = json_extract(product_detail, '$.product_price'),
+            line_total = json_extract(product_detail, '$.product_price')
+                         * coalesce(json_extract(product_detail, '$.quantity'), 1)
+        WHERE product_id IS NULL AND product_detail IS NOT NULL
+    """)
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_order_detail_product_id_order_id")
+
+
+def migrate_order_total_amount(connection):
+    """Stored order totals; the sales rollups are filled by ``python -m app.manage rebuild-rollups``."""
+    if add_missing_columns(connection, "order", {"total_amount": "FLOAT NOT NULL DEFAULT 0"}):
+        connection.exec_driver_sql("""
+            UPDATE "order" SET total_amount = (
+                SELECT coalesce(sum(line_total), 0) FROM order_detail WHERE order_detail.order_id = "order".id
+            )
+        """)
+
+
+def migrate_order_client_id(connection):
+    """Client-generated order IDs; the unique index is created with the other missing indexes."""
+    add_missing_columns(connection, "order", {"client_id": "VARCHAR(64)"})
+    # client IDs used to be unique across all users, now per (created_by, client_id)
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_order_client_id")
+
+
+def migrate_stock(connection):
+    """Stock levels (NULL: not tracked) and per-line stock reservations."""
+    add_missing_columns(connection, "product", {"stock": "INTEGER"})
+    add_missing_columns(connection, "order_detail", {"reserved_quantity": "INTEGER NOT NULL DEFAULT 0"})
+
+
+def migrate_revoked_token_ids(connection):
+    """Revocation sync pulls rows by increasing id, which breaks if ids of pruned rows come back."""
+    add_autoincrement(connection, "revoked_token")
+
+
+def migrate_order_ids(connection):
+    """Archival moves orders out with their ids; without AUTOINCREMENT new orders would reuse them."""
+    add_autoincrement(connection, "order", used_by=("order_archive",))
+    add_autoincrement(connection, "order_detail", used_by=("order_detail_archive",))
+
+
+MIGRATIONS = [
+    migrate_order_lines,
+    migrate_order_total_amount,
+    migrate_order_client_id,
+    migrate_stock,
+    migrate_revoked_token_ids,
+    migrate_order_ids,
+]
+
+
+def run_migrations(connection):
+    for migration in MIGRATIONS:
+        migration(connection)
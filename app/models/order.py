@@ -1,6 +1,7 @@
 import datetime
+from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, TIMESTAMP, JSON, ForeignKey
+from sqlalchemy import Integer, String, TIMESTAMP, JSON, Float, ForeignKey, Index
 
 from app.database import Base
 
@@ -11,21 +12,40 @@ class Order(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     items: Mapped[list] = mapped_column(JSON, default=[])
     created_by: Mapped[int] = mapped_column(Integer)
+    total_amount: Mapped[float] = mapped_column(Float, default=0)
+    # unique per user, see ix_order_created_by_client_id
+    client_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
 
     order_details = relationship('OrderDetail', back_populates='order', lazy='selectin')
 
-    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True,
                                                           default=lambda: datetime.datetime.now(datetime.timezone.utc))
     updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
                                                           default=lambda: datetime.datetime.now(datetime.timezone.utc),
                                                           onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
 
+    # AUTOINCREMENT: archived orders keep their ids, so SQLite must not hand them out again
+    __table_args__ = (
+        Index('ix_order_created_by_created_at', 'created_by', 'created_at'),
+        # tills generate client IDs independently, so they only have to be unique per user
+        Index('ix_order_created_by_client_id', 'created_by', 'client_id', unique=True),
+        {'sqlite_autoincrement': True},
+    )
+
+
 class OrderDetail(Base):
     __tablename__ = 'order_detail'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    order_id: Mapped[int] = mapped_column(Integer, ForeignKey('order.id'))
-    product_detail: Mapped[dict] = mapped_column(JSON)
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey('order.id'), index=True)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey('product.id'))
+    quantity: Mapped[int] = mapped_column(Integer, default=1)
+    unit_price: Mapped[float] = mapped_column(Float)
+    line_total: Mapped[float] = mapped_column(Float)
+    # units taken out of stock for this line and not yet shipped or returned
+    reserved_quantity: Mapped[int] = mapped_column(Integer, default=0)
+    # name/description snapshot kept for API compatibility; the typed columns above are authoritative
+    product_detail: Mapped[dict] = mapped_column(JSON, nullable=True)
     status: Mapped[str] = mapped_column(String(255), default='pending')
 
     order = relationship('Order', back_populates='order_details', lazy='selectin')
@@ -36,3 +56,47 @@ class OrderDetail(Base):
                                                             default=lambda: datetime.datetime.now(datetime.timezone.utc),
                                                             onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
 
+    __table_args__ = (
+        Index('ix_order_detail_status_order_id', 'status', 'order_id'),
+        Index('ix_order_detail_product_order', 'product_id', 'order_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class OrderArchive(Base):
+    """Finished orders moved out of ``order`` by the archival job; same columns plus ``archived_at``."""
+    __tablename__ = 'order_archive'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    items: Mapped[list] = mapped_column(JSON, default=[])
+    created_by: Mapped[int] = mapped_column(Integer)
+    total_amount: Mapped[float] = mapped_column(Float, default=0)
+    client_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    order_details = relationship('OrderDetailArchive', lazy='selectin')
+
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True)
+    updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True))
+    archived_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True))
+
+    __table_args__ = (
+        Index('ix_order_archive_created_by_created_at', 'created_by', 'created_at'),
+    )
+
+
+class OrderDetailArchive(Base):
+    __tablename__ = 'order_detail_archive'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey('order_archive.id'), index=True)
+    # no foreign key to product: archived lines outlive deleted products
+    product_id: Mapped[int] = mapped_column(Integer)
+    quantity: Mapped[int] = mapped_column(Integer, default=1)
+    unit_price: Mapped[float] = mapped_column(Float)
+    line_total: Mapped[float] = mapped_column(Float)
+    reserved_quantity: Mapped[int] = mapped_column(Integer, default=0)
+    product_detail: Mapped[dict] = mapped_column(JSON, nullable=True)
+    status: Mapped[str] = mapped_column(String(255))
+
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True))
+    updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True))
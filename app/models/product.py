@@ -1,6 +1,7 @@
 import datetime
+from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, TIMESTAMP, Float
+from sqlalchemy import Integer, String, TIMESTAMP, Float, event
 
 from app.database import Base
 
@@ -12,10 +13,64 @@ class Product(Base):
     name: Mapped[str] = mapped_column(String(255), unique=True)
     price: Mapped[float] = mapped_column(Float)
     description: Mapped[str] = mapped_column(String(255))
+    # NULL means the product is not stock-tracked and never runs out
+    stock: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
-    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True,
                                                           default=lambda: datetime.datetime.now(datetime.timezone.utc))
-    updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),
+    updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True,
                                                           default=lambda: datetime.datetime.now(datetime.timezone.utc),
                                                           onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
 
+
+class ProductTombstone(Base):
+    __tablename__ = 'product_tombstone'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer)
+
+    deleted_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True,
+                                                          default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+# External-content FTS5 index over product name/description, kept in sync by triggers
+PRODUCT_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+    name, description,
+    content='product', content_rowid='id',
+    prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+PRODUCT_SEARCH_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_search(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_search(product_search, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO product_search(product_search, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_search(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_product_search(target, connection, **kw):
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'").first()
+    connection.exec_driver_sql(PRODUCT_SEARCH_TABLE)
+    for trigger in PRODUCT_SEARCH_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    if not exists:
+        # index the products that were there before the search table
+        connection.exec_driver_sql("INSERT INTO product_search(product_search) VALUES ('rebuild')")
@@ -0,0 +1,23 @@
+import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Integer, Date, Float
+
+from app.database import Base
+
+
+class SalesDaily(Base):
+    __tablename__ = 'sales_daily'
+
+    day: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    order_count: Mapped[int] = mapped_column(Integer, default=0)
+    units: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0)
+
+
+class SalesProductDaily(Base):
+    __tablename__ = 'sales_product_daily'
+
+    day: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    units: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(Float, default=0)
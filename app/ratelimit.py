@@ -0,0 +1,107 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import jwt
+from jwt import InvalidTokenError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.auth.utils import principal_cache
+from app.config import SECRET, ALGORITHM, RATE_LIMITS, RATE_LIMIT_MAX_BUCKETS
+
+
+class TokenBuckets:
+    """Token buckets as ``[tokens, last_refill]`` pairs, least recently used evicted first.
+
+    An evicted bucket was idle the longest, and a fresh one starts full, so
+    eviction only ever lets a quiet client through, never blocks one.
+    """
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.allowed = 0
+        self.rejected = 0
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """Take one token; returns 0 if allowed, else the seconds until a token is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0.0
+        self.rejected += 1
+        return (1 - bucket[0]) / rate
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "allowed": self.allowed, "rejected": self.rejected}
+
+
+rate_limit_buckets = TokenBuckets()
+
+
+def bearer_subject(scope: Scope) -> Optional[str]:
+    """The ``sub`` of a valid bearer token, from the principal cache when it is there."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            principal = principal_cache.peek(token)
+            if principal is not None:
+                return principal[0].username
+            try:
+                return jwt.decode(token, SECRET, algorithms=[ALGORITHM]).get("sub")
+            except InvalidTokenError:
+                return None
+    return None
+
+
+class RateLimitMiddleware:
+    """Rejects requests over their route's token bucket with ``429`` and ``Retry-After``.
+
+    Limits are looked up by exact ``"METHOD /path"`` with ``"*"`` as the
+    fallback. ``"user"`` limits fall back to the client IP for anonymous
+    callers and invalid tokens.
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict = RATE_LIMITS, buckets: TokenBuckets = rate_limit_buckets):
+        self.app = app
+        self.limits = limits
+        self.buckets = buckets
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{scope['method']} {scope['path']}"
+        if route not in self.limits:
+            route = "*"
+        limit = self.limits.get(route)
+        if not limit:
+            await self.app(scope, receive, send)
+            return
+
+        subject = bearer_subject(scope) if limit.get("key") == "user" else None
+        client = f"user:{subject}" if subject else f"ip:{scope['client'][0] if scope.get('client') else ''}"
+        retry_after = self.buckets.take(f"{route} {client}", limit["rate"], limit["burst"])
+        if retry_after:
+            response = JSONResponse({"detail": "Too many requests"}, status_code=429,
+                                    headers={"Retry-After": str(math.ceil(retry_after))})
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
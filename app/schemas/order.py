@@ -1,6 +1,11 @@
 import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Literal, Optional
+
+from app.config import MAX_STATUS_BATCH_SIZE
+
+
+OrderStatus = Literal["pending", "picking", "completed", "cancelled"]
 
 
 class OrderDetailBase(BaseModel):
@@ -24,6 +29,11 @@ class OrderDetailUpdate(OrderDetailBase):
 
 class OrderDetailResponse(OrderDetailBase):
     id: int = Field(..., description="The ID of the order detail")
+    product_id: int = Field(..., description="The ID of the ordered product")
+    quantity: int = Field(..., description="The ordered quantity")
+    unit_price: float = Field(..., description="The product price at the time of the order")
+    line_total: float = Field(..., description="unit_price multiplied by quantity")
+    reserved_quantity: int = Field(..., description="The units held in stock for this line")
     created_at: datetime.datetime = Field(..., description="The time the order detail was created")
     updated_at: datetime.datetime = Field(..., description="The time the order detail was updated")
 
@@ -42,7 +52,8 @@ class OrderDetailResponse(OrderDetailBase):
 
 
 class OrderBase(BaseModel):
-    items: list = Field(..., description="The items of the order", examples=[1,2,3,4])
+    items: list[int] = Field(..., min_length=1, description="The product IDs of the order, repeated for quantity",
+                             examples=[[1, 2, 2, 3]])
 
 
 class OrderCreate(OrderBase):
@@ -50,12 +61,14 @@ class OrderCreate(OrderBase):
 
 
 class OrderUpdate(OrderBase):
-    items: Optional[list] = Field(None, description="The items of the order", examples=[1,2,3,4])
+    items: Optional[list[int]] = Field(None, min_length=1, description="The product IDs of the order, repeated for quantity",
+                                       examples=[[1, 2, 2, 3]])
 
 
 class OrderResponse(OrderBase):
     id: int = Field(..., description="The ID of the order")
     order_details: Optional[OrderDetailResponse] = Field(..., description="The details of the order")
+    total_amount: float = Field(..., description="The sum of the order line totals")
     created_at: datetime.datetime = Field(..., description="The time the order was created")
     updated_at: datetime.datetime = Field(..., description="The time the order was updated")
 
@@ -71,3 +84,55 @@ class OrderResponse(OrderBase):
         }
 
 
+
+
+class OrderBatchItem(OrderCreate):
+    client_id: str = Field(..., min_length=1, max_length=64, description="The ID the till generated for the order",
+                           examples=["till-3-000128"])
+
+
+class OrderBatchResult(BaseModel):
+    index: int = Field(..., description="The position of the order in the batch")
+    client_id: Optional[str] = Field(None, description="The ID the till generated for the order")
+    status: Literal["created", "duplicate", "error"] = Field(..., description="What happened to the order")
+    order_id: Optional[int] = Field(None, description="The ID of the created or already existing order")
+    detail: Optional[Any] = Field(None, description="Why the order was rejected")
+
+
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus = Field(..., description="The new status of every line of the order", examples=["completed"])
+
+
+class OrderStatusQuery(BaseModel):
+    order_ids: list[int] = Field(..., min_length=1, max_length=MAX_STATUS_BATCH_SIZE,
+                                 description="The IDs of the orders", examples=[[1, 2, 3]])
+
+
+class FulfilmentRequest(BaseModel):
+    order_ids: list[int] = Field(..., min_length=1, max_length=MAX_STATUS_BATCH_SIZE,
+                                 description="The IDs of the orders", examples=[[1, 2, 3]])
+    status: Literal["picking", "completed"] = Field(
+        ..., description="picking moves pending lines, completed moves lines being picked", examples=["picking"])
+
+
+class FulfilmentQueued(BaseModel):
+    queued: int = Field(..., description="The number of order lines queued for the transition")
+
+
+class OrderStatusSummary(BaseModel):
+    order_id: int = Field(..., description="The ID of the order")
+    status: str = Field(..., description="The status of all lines if they agree, otherwise in_progress "
+                                         "or partially_completed", examples=["completed", "in_progress"])
+    lines: int = Field(..., description="The number of lines of the order")
+    pending: int = Field(..., description="The number of pending lines")
+    picking: int = Field(..., description="The number of lines being picked")
+    completed: int = Field(..., description="The number of completed lines")
+    cancelled: int = Field(..., description="The number of cancelled lines")
+
+    class Config:
+        from_attributes = True
+
+
+class OrderStatusBatch(BaseModel):
+    orders: list[OrderStatusSummary] = Field(..., description="The status of every found order")
+    missing: list[int] = Field(..., description="The IDs of orders that were not found")
@@ -0,0 +1,11 @@
+from typing import Generic, Optional, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T] = Field(..., description="The items of the page")
+    next_cursor: Optional[str] = Field(None, description="The cursor of the next page, null on the last page",
+                                       examples=["WyIyMDIxLTA4LTAxVDEyOjAwOjAwIiwgMV0"])
@@ -8,6 +8,8 @@ class ProductBase(BaseModel):
     price: float = Field(..., description="The price of the product", examples=[100.0])
     description: str = Field(..., min_length=3, max_length=255, description="The description of the product",
                              examples=["Description of product 1"])
+    stock: Optional[int] = Field(None, ge=0, description="The units in stock, null if stock is not tracked",
+                                 examples=[25])
 
 
 class ProductCreate(ProductBase):
@@ -34,7 +36,36 @@ class ProductResponse(ProductBase):
                 "name": "Product 1",
                 "price": 100.0,
                 "description": "Description of product 1",
+                "stock": 25,
                 "created_at": "2021-08-01T12:00:00",
                 "updated_at": "2021-08-01T12:00:00"
             }
         }
+
+
+class CatalogProduct(BaseModel):
+    """A product as served from the catalog cache, without ``stock``.
+
+    Stock changes with every checkout; keeping it out lets the cached pages
+    and their ETags survive checkouts. Live stock is at ``GET /products/stock``.
+    """
+    id: int = Field(..., description="The ID of the product")
+    name: str = Field(..., description="The name of the product", examples=["Product 1"])
+    price: float = Field(..., description="The price of the product", examples=[100.0])
+    description: str = Field(..., description="The description of the product", examples=["Description of product 1"])
+    created_at: datetime.datetime = Field(..., description="The time the product was created")
+    updated_at: datetime.datetime = Field(..., description="The time the product was updated")
+
+    class Config:
+        from_attributes = True
+
+
+class ProductStock(BaseModel):
+    product_id: int = Field(..., description="The ID of the product")
+    stock: Optional[int] = Field(None, description="The units in stock, null if stock is not tracked", examples=[25])
+
+
+class ProductChanges(BaseModel):
+    updated: list[ProductResponse] = Field(..., description="Products created or updated since the token")
+    deleted: list[int] = Field(..., description="IDs of the products deleted since the token", examples=[[3, 7]])
+    token: str = Field(..., description="The token to pass as `since` on the next sync")
@@ -0,0 +1,31 @@
+import datetime
+from pydantic import BaseModel, Field
+
+
+class SalesDay(BaseModel):
+    day: datetime.date = Field(..., description="The day (UTC)")
+    order_count: int = Field(..., description="The number of orders placed that day")
+    units: int = Field(..., description="The number of units sold that day")
+    revenue: float = Field(..., description="The revenue of that day")
+
+    class Config:
+        from_attributes = True
+
+
+class ProductSales(BaseModel):
+    product_id: int = Field(..., description="The ID of the product")
+    units: int = Field(..., description="The number of units sold in the range")
+    revenue: float = Field(..., description="The revenue of the product in the range")
+
+    class Config:
+        from_attributes = True
+
+
+class SalesReport(BaseModel):
+    date_from: datetime.date = Field(..., description="The first day of the range")
+    date_to: datetime.date = Field(..., description="The last day of the range")
+    order_count: int = Field(..., description="The number of orders in the range")
+    units: int = Field(..., description="The number of units sold in the range")
+    revenue: float = Field(..., description="The revenue of the range")
+    days: list[SalesDay] = Field(..., description="Per-day totals")
+    top_products: list[ProductSales] = Field(..., description="The best-selling products by revenue")
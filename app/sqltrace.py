@@ -0,0 +1,110 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import SQL_TRACE_SAMPLE_RATE, SQL_TRACE_REPEAT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# "IN (?, ?, ?)" and "VALUES (?, ?), (?, ?)" vary with the number of parameters, not with the query
+PARAMETER_LIST = re.compile(r"\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))*")
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[PARAMETER_LIST.sub("(?)", statement)] += 1
+
+
+# set only for sampled requests, so unsampled ones and background jobs pay a single ContextVar lookup
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_query_stats.get() is not None:
+        context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    if stats is not None and hasattr(context, "query_started"):
+        stats.record(statement, time.perf_counter() - context.query_started)
+
+
+def instrument_engine(engine: Engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class QueryTimingMiddleware:
+    """Counts and times the SQL of a sample of requests.
+
+    Sampled responses get a ``Server-Timing`` header and a JSON log line, and
+    a warning is logged when one statement shape runs more than
+    ``repeat_threshold`` times in a request, the signature of an N+1 loop.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = SQL_TRACE_SAMPLE_RATE,
+                 repeat_threshold: int = SQL_TRACE_REPEAT_THRESHOLD):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries", '
+                                                f'app;dur={(time.perf_counter() - started) * 1000:.1f}')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            self.report(scope, status_code, stats, time.perf_counter() - started)
+
+    def report(self, scope: Scope, status_code: int, stats: QueryStats, seconds: float):
+        route = scope.get("route")
+        path = route.path_format if route is not None else scope["path"]
+        logger.info(json.dumps({
+            "method": scope["method"],
+            "path": path,
+            "status": status_code,
+            "duration_ms": round(seconds * 1000, 2),
+            "queries": stats.count,
+            "db_ms": round(stats.seconds * 1000, 2),
+        }))
+        for shape, count in stats.shapes.items():
+            if count > self.repeat_threshold:
+                logger.warning("Possible N+1 in %s %s: statement ran %d times: %s",
+                               scope["method"], path, count, shape[:200])
@@ -0,0 +1,33 @@
+import zlib
+from typing import AsyncIterator
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed request body into text lines without reading all of it."""
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            text = line.decode().rstrip("\r")
+            if first:
+                text, first = text.lstrip("\ufeff"), False
+            yield text
+    if buffer:
+        text = buffer.decode().rstrip("\r")
+        yield text.lstrip("\ufeff") if first else text
+
+
+async def gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def encode_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        yield chunk.encode()
@@ -0,0 +1,14 @@
+import datetime
+from typing import Optional
+
+
+def to_naive_utc(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Convert an aware timestamp to the naive UTC form SQLite stores.
+
+    SQLite's DateTime drops the offset without converting, so an aware bound
+    parameter would be compared by its wall-clock time. Naive values are taken
+    to be UTC already and pass through, as does ``None``.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
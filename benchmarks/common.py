@@ -0,0 +1,31 @@
+"""Shared setup for the benchmarks. Import it, and call ``use_scratch_database``, before anything from ``app``."""
+import os
+import statistics
+import tempfile
+
+
+def use_scratch_database(**settings) -> str:
+    """Point the app at a fresh SQLite file and apply ``settings`` as environment variables.
+
+    The app reads its configuration at import time, so this has to run first.
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="newera-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    os.environ.update({name: str(value) for name, value in settings.items()})
+    os.environ.setdefault("SECRET", "benchmark")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+    # no background fulfilment or request sampling skewing the numbers
+    os.environ.setdefault("FULFILMENT_WORKERS", "0")
+    os.environ.setdefault("SQL_TRACE_SAMPLE_RATE", "0")
+    return path
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[min(max(int(q), 1), 99) - 1]
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} ms"
@@ -0,0 +1,88 @@
+"""Login latency, and the latency of concurrent reads while a burst of logins is hashing.
+
+    python -m benchmarks.login_latency --logins 50 --burst 40 --hash-workers 2
+
+With bcrypt on the event loop every read waits behind the whole burst; with the
+hash pool reads stay in the low milliseconds and logins queue in the pool instead.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import use_scratch_database, percentile, ms
+
+parser = argparse.ArgumentParser(description="Measure login latency and read latency during a login burst")
+parser.add_argument("--logins", type=int, default=30, help="sequential logins timed one by one")
+parser.add_argument("--burst", type=int, default=40, help="logins fired at once")
+parser.add_argument("--hash-workers", type=int, default=2, help="PASSWORD_HASH_WORKERS")
+parser.add_argument("--hash-queue", type=int, default=64, help="PASSWORD_HASH_QUEUE_SIZE")
+args = parser.parse_args()
+
+use_scratch_database(PASSWORD_HASH_WORKERS=args.hash_workers, PASSWORD_HASH_QUEUE_SIZE=args.hash_queue)
+
+from fastapi import HTTPException  # noqa: E402
+
+from app import router  # noqa: E402, F401  registers every model
+from app.auth.hashing import password_hash_pool  # noqa: E402
+from app.auth.superuser import create_superuser  # noqa: E402
+from app.auth.utils import authenticate_user, create_access_token  # noqa: E402
+from app.crud.product import get_products  # noqa: E402
+from app.database import create_tables, read_session_maker  # noqa: E402
+
+
+async def login() -> float:
+    """What POST /auth/login does: look the user up, verify the password, sign a token."""
+    started = time.perf_counter()
+    async with read_session_maker() as session:
+        user = await authenticate_user(session, "admin", "admin")
+    assert user, "the admin login failed"
+    create_access_token({"sub": user.username})
+    return time.perf_counter() - started
+
+
+async def read() -> float:
+    started = time.perf_counter()
+    async with read_session_maker() as session:
+        await get_products(session, 20)
+    return time.perf_counter() - started
+
+
+async def read_while(task: asyncio.Future) -> list[float]:
+    latencies = []
+    while not task.done():
+        latencies.append(await read())
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+def summary(latencies: list[float]) -> str:
+    return (f"n={len(latencies):<4} p50 {ms(percentile(latencies, 50)):>9}  p95 {ms(percentile(latencies, 95)):>9}  "
+            f"max {ms(max(latencies, default=0)):>9}")
+
+
+async def main():
+    await create_tables()
+    await create_superuser()
+
+    idle_reads = [await read() for _ in range(50)]
+    sequential = [await login() for _ in range(args.logins)]
+
+    burst = asyncio.gather(*[login() for _ in range(args.burst)], return_exceptions=True)
+    burst_reads = await read_while(burst)
+    results = await burst
+    burst_logins = [result for result in results if isinstance(result, float)]
+    rejected = sum(isinstance(result, HTTPException) and result.status_code == 503 for result in results)
+
+    print(f"hash workers {args.hash_workers}, queue {args.hash_queue}")
+    print(f"reads, idle          {summary(idle_reads)}")
+    print(f"logins, sequential   {summary(sequential)}")
+    print(f"logins, burst of {args.burst:<3} {summary(burst_logins)}  rejected {rejected}")
+    print(f"reads, during burst  {summary(burst_reads)}")
+    stats = password_hash_pool.stats()
+    print(f"hash pool wait: avg {ms(stats['avg_wait_seconds'])}, max {ms(stats['max_wait_seconds'])}; "
+          f"bcrypt run: avg {ms(stats['avg_run_seconds'])}")
+    password_hash_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""SQL statements per order creation by basket size; with set-based creation the count stays flat.
+
+    python -m benchmarks.order_queries --sizes 1 10 50 200 --repeat 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import use_scratch_database, ms
+
+use_scratch_database()
+
+from app import router  # noqa: E402, F401  registers every model
+from app.crud.order import create_order  # noqa: E402
+from app.database import create_tables, writer_session  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.schemas.order import OrderCreate  # noqa: E402
+from app.sqltrace import QueryStats, current_query_stats  # noqa: E402
+
+
+async def seed_products(count: int):
+    async with writer_session() as session:
+        session.add_all(Product(name=f"product {i:05d}", price=1.5, description="benchmark product", stock=10 ** 9)
+                        for i in range(count))
+        await session.commit()
+
+
+async def measure(items: list[int]) -> tuple[QueryStats, float]:
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        async with writer_session() as session:
+            await create_order(session, OrderCreate(items=items), user_id=1)
+    finally:
+        current_query_stats.reset(token)
+    return stats, time.perf_counter() - started
+
+
+async def main(args):
+    await create_tables()
+    await seed_products(max(args.sizes))
+
+    print(f"{'basket':>8} {'distinct':>9} {'queries':>8} {'db time':>10} {'total':>10}")
+    for size in args.sizes:
+        runs = []
+        for _ in range(args.repeat):
+            # about one line in five repeats a product, as scanned baskets do
+            items = [random.randint(1, max(1, size * 4 // 5)) for _ in range(size)]
+            runs.append((len(set(items)), *await measure(items)))
+        distinct, stats, seconds = runs[-1]
+        print(f"{size:>8} {distinct:>9} {stats.count:>8} {ms(sum(s.seconds for _, s, _ in runs) / len(runs)):>10} "
+              f"{ms(sum(t for _, _, t in runs) / len(runs)):>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the SQL statements order creation runs per basket size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=5, help="orders created per basket size")
+    asyncio.run(main(parser.parse_args()))
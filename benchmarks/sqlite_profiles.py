@@ -0,0 +1,113 @@
+"""Checkout throughput with and without the tuned SQLite profile.
+
+    python -m benchmarks.sqlite_profiles --processes 4 --shoppers 10 --orders 20
+
+Every profile gets a fresh database and ``--processes`` worker processes, as
+with ``uvicorn --workers``; each runs ``--shoppers`` concurrent shoppers that
+create orders and list products. The write lock only serialises writers inside
+one process, so the processes contend for SQLite's own lock as in production.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import use_scratch_database
+
+PROFILES = ("default", "tuned")
+PRODUCTS = 20
+
+
+async def setup():
+    from app import router  # noqa: F401  registers every model
+    from app.database import create_tables, writer_session
+    from app.models.product import Product
+
+    await create_tables()
+    async with writer_session() as session:
+        session.add_all(Product(name=f"product {i:03d}", price=2.5, description="benchmark product", stock=10 ** 9)
+                        for i in range(PRODUCTS))
+        await session.commit()
+
+
+async def work(shoppers: int, orders: int):
+    from sqlalchemy.exc import OperationalError
+
+    from app import router  # noqa: F401  registers every model
+    from app.crud.order import create_order
+    from app.crud.product import get_products
+    from app.database import read_session_maker, writer_session
+    from app.schemas.order import OrderCreate
+
+    result = {"orders": 0, "errors": {}}
+
+    async def shopper(number: int):
+        for i in range(orders):
+            items = [(number + i + line) % PRODUCTS + 1 for line in range(5)]
+            try:
+                async with writer_session() as session:
+                    await create_order(session, OrderCreate(items=items), user_id=1)
+                result["orders"] += 1
+                async with read_session_maker() as session:
+                    await get_products(session, 20)
+            except OperationalError as e:
+                message = str(e.orig)
+                result["errors"][message] = result["errors"].get(message, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[shopper(number) for number in range(shoppers)])
+    result["seconds"] = time.perf_counter() - started
+    print(json.dumps(result))
+
+
+def run_profile(profile: str, args) -> dict:
+    use_scratch_database(SQLITE_PROFILE=profile)
+    command = [sys.executable, "-m", "benchmarks.sqlite_profiles"]
+    subprocess.run(command + ["--setup"], check=True, env=os.environ, stderr=subprocess.DEVNULL)
+
+    started = time.perf_counter()
+    workers = [
+        subprocess.Popen(command + ["--work", "--shoppers", str(args.shoppers), "--orders", str(args.orders)],
+                         env=os.environ, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(args.processes)
+    ]
+    results = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+    seconds = time.perf_counter() - started
+
+    errors = {}
+    for result in results:
+        for message, count in result["errors"].items():
+            errors[message] = errors.get(message, 0) + count
+    return {"orders": sum(result["orders"] for result in results), "seconds": seconds, "errors": errors}
+
+
+def main(args):
+    attempted = args.processes * args.shoppers * args.orders
+    print(f"{args.processes} processes x {args.shoppers} shoppers x {args.orders} orders = {attempted} checkouts")
+    for profile in args.profiles:
+        result = run_profile(profile, args)
+        print(f"{profile:>8}: {result['orders']:>5} orders in {result['seconds']:.1f} s "
+              f"= {result['orders'] / result['seconds']:.0f} orders/s, {sum(result['errors'].values())} failed")
+        for message, count in result["errors"].items():
+            print(f"{'':>10}{count} x {message}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare checkout throughput across SQLite profiles")
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--shoppers", type=int, default=10, help="concurrent shoppers per process")
+    parser.add_argument("--orders", type=int, default=20, help="orders per shopper")
+    parser.add_argument("--setup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--work", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        asyncio.run(setup())
+    elif args.work:
+        asyncio.run(work(args.shoppers, args.orders))
+    else:
+        main(args)